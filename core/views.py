@@ -8,44 +8,43 @@ from django.contrib import messages
 from django.views.generic import FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import PasswordChangeView
-from datetime import timedelta
-from django.utils import timezone
-from django.db.models import Count, Q, F, FloatField, ExpressionWrapper
 from django.contrib.auth.views import LoginView
-from movies.recommendation import get_for_you_recommendation
+from django.utils.functional import SimpleLazyObject
+from movies.recommendation import get_cached_for_you_recommendation
+from movies.popularity import get_popular_movies
+from movies.conditional import for_you_version, home_etag, home_last_modified, revalidate
+from movie_recommendation.metrics import span
 
+def load_popular_row():
+    with span("home.popular"):
+        popular_movies = list(get_popular_movies(Movie.objects.prefetch_related("genres", "language"))[:8])
+    return {"movies": popular_movies[:7], "more": len(popular_movies) == 8}
+
+def load_for_you_row(user):
+    with span("home.for_you"):
+        return get_cached_for_you_recommendation(user, 7)
+
+@revalidate(home_etag, home_last_modified)
 def home(request):
-    last_7_days = timezone.now() - timedelta(days=7)
+    # Rows are loaded lazily, only when their cached fragment has expired.
     recent_movies = Movie.objects.prefetch_related("language", "genres").order_by("-created_at")[:7]
-    popular_movies = Movie.objects.prefetch_related("genres", "language").annotate(
-            recent_likes=Count("likes", filter=Q(likes__created_at__gte=last_7_days)),
-            recent_views=Count("views", filter=Q(views__created_at__gte=last_7_days))
-        ).annotate(
-            popularity=ExpressionWrapper(
-                F("recent_likes") / (F("recent_views") + 1.0),
-                output_field=FloatField()
-            )
-        )
-    popular_movies = popular_movies.filter(popularity__gt=0).order_by("-popularity", "-recent_likes", "-recent_views", "-pk")
+    popular = SimpleLazyObject(load_popular_row)
 
-    if len(popular_movies) == 8:
-        popular_movies = popular_movies[:7]
-        popular_more = True
-    else:
-        popular_more = False
-    
     if request.user.is_authenticated:
-        for_you = get_for_you_recommendation(request.user, 7)
+        for_you = SimpleLazyObject(lambda: load_for_you_row(request.user))
+        taste_version = for_you_version(request)
     else:
-        for_you = None        
+        for_you = None
+        taste_version = None
 
     context = {
         "recent_movies": recent_movies,
-        "popular_movies": popular_movies,
-        "popular_more":popular_more,
-        "for_you": for_you
+        "popular": popular,
+        "for_you": for_you,
+        "for_you_version": taste_version,
     }
-    return render(request, "core/home.html", context)
+    with span("render"):
+        return render(request, "core/home.html", context)
 
 class CustomLoginView(LoginView):
     template_name = 'core/login.html'
@@ -0,0 +1,246 @@
+import bisect
+import contextlib
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from movie_recommendation.query_budget import QueryRecorder
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.series = {}
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.series.items()):
+            yield self.name, labels, value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            # Per-bucket counts, plus one overflow bucket, then sum and count.
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + (("le", "+Inf" if bound == float("inf") else repr(bound)),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Registry:
+    """Process-wide counters and histograms. Each worker process keeps its
+    own; Prometheus sums them across scrape targets."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, documentation, **options):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(name, cls(name, documentation, **options))
+        return metric
+
+    def counter(self, name, documentation) -> Counter:
+        return self._get(Counter, name, documentation)
+
+    def histogram(self, name, documentation, buckets=None) -> Histogram:
+        metric = self.metrics.get(name)
+        if metric is None:
+            buckets = buckets or getattr(settings, "METRICS", {}).get("BUCKETS") or DEFAULT_BUCKETS
+            metric = self._get(Histogram, name, documentation, buckets=buckets)
+        return metric
+
+    def inc(self, name, documentation, labels=(), amount=1):
+        metric = self.counter(name, documentation)
+        with self.lock:
+            metric.inc(labels, amount)
+
+    def observe(self, name, documentation, labels, value):
+        metric = self.histogram(name, documentation)
+        with self.lock:
+            metric.observe(labels, value)
+
+    def add_collector(self, collect):
+        """Call ``collect()`` on every render for values kept elsewhere. It
+        yields (name, documentation, type, [(labels, value), ...])."""
+        with self.lock:
+            if collect not in self.collectors:
+                self.collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for name, metric in sorted(self.metrics.items()):
+                lines.append(f"# HELP {name} {metric.documentation}")
+                lines.append(f"# TYPE {name} {metric.type}")
+                lines.extend(f"{sample}{_format_labels(labels)} {value}" for sample, labels, value in metric.samples())
+            collectors = list(self.collectors)
+        for collect in collectors:
+            for name, documentation, metric_type, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.metrics.clear()
+
+
+registry = Registry()
+
+_enabled = None
+
+
+def metrics_enabled() -> bool:
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(getattr(settings, "METRICS", {}).get("ENABLED", False))
+    return _enabled
+
+
+@receiver(setting_changed)
+def _reset_enabled(setting, **kwargs):
+    global _enabled
+    if setting == "METRICS":
+        _enabled = None
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        registry.observe(
+            "movie_recommendation_stage_duration_seconds",
+            "Time spent in one stage of request handling or recommendation.",
+            (("stage", self.stage),),
+            time.perf_counter() - self.started,
+        )
+
+
+_DISABLED_SPAN = contextlib.nullcontext()
+
+
+def span(stage):
+    """Time the block as ``stage`` in the stage duration histogram. When
+    metrics are disabled this returns a shared no-op context manager."""
+    if not metrics_enabled():
+        return _DISABLED_SPAN
+    return _Span(stage)
+
+
+class MetricsMiddleware:
+    """Count requests and record their latency, database time and query
+    count per route, plus template rendering time as the "render" stage.
+    Removed from the stack entirely when METRICS is disabled."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        async with recorder.arecord():
+            response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    def observe(self, request, response, elapsed, recorder):
+        # The route pattern keeps the label set small: one series per URL
+        # pattern, not per requested path.
+        match = request.resolver_match
+        view = (match.route or match.view_name) if match else "unmatched"
+        labels = (("view", view),)
+        registry.inc(
+            "movie_recommendation_http_requests_total",
+            "HTTP requests by view, method and status.",
+            labels + (("method", request.method), ("status", response.status_code)),
+        )
+        registry.observe("movie_recommendation_http_request_duration_seconds", "HTTP request latency by view.", labels, elapsed)
+        registry.observe(
+            "movie_recommendation_http_request_db_duration_seconds",
+            "Database time per HTTP request by view.",
+            labels,
+            recorder.db_time_ms / 1000,
+        )
+        registry.inc("movie_recommendation_http_db_queries_total", "Database queries run by HTTP requests by view.", labels, recorder.count)
+
+    def process_template_response(self, request, response):
+        render_span = span("render")
+        render_span.__enter__()
+        response.add_post_render_callback(lambda rendered: render_span.__exit__(None, None, None))
+        return response
+
+
+def metrics_view(request):
+    """Serve the registry in the Prometheus text exposition format."""
+    if not metrics_enabled():
+        raise Http404("Metrics are disabled.")
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
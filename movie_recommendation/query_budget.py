@@ -0,0 +1,179 @@
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def normalize_sql(sql) -> str:
+    """Collapse literals, placeholders and IN lists so the same statement run
+    for different rows compares equal."""
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# Recorders active in the current context. Async requests can share one
+# thread, and so one connection, so each recorder only counts the queries
+# run from the context that started it.
+_active_recorders = contextvars.ContextVar("active_query_recorders", default=())
+
+
+class QueryRecorder:
+    """Record every query run on this thread's connections while active."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if self not in _active_recorders.get():
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def _install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def _uninstall(self):
+        # By identity rather than pop(): requests interleaved on one thread
+        # do not finish in the order they started.
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    @contextmanager
+    def record(self):
+        token = _active_recorders.set(_active_recorders.get() + (self,))
+        self._install()
+        try:
+            yield self
+        finally:
+            self._uninstall()
+            _active_recorders.reset(token)
+
+    @asynccontextmanager
+    async def arecord(self):
+        """record() for async code. The ORM runs in sync_to_async threads
+        with their own connections, so the wrappers are installed there."""
+        token = _active_recorders.set(_active_recorders.get() + (self,))
+        await sync_to_async(self._install)()
+        try:
+            yield self
+        finally:
+            await sync_to_async(self._uninstall)()
+            _active_recorders.reset(token)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def db_time_ms(self) -> float:
+        return sum(duration for _, duration in self.queries) * 1000
+
+    def repeated(self, threshold=2) -> list:
+        """Return (normalized sql, count) for statements run ``threshold`` or
+        more times, the usual signature of an N+1 loop."""
+        counts = Counter(normalize_sql(sql) for sql, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+    def violations(self, max_queries=None, max_db_time_ms=None, max_repeats=None) -> list:
+        problems = []
+        if max_queries is not None and self.count > max_queries:
+            problems.append(f"{self.count} queries (budget {max_queries})")
+        if max_db_time_ms is not None and self.db_time_ms > max_db_time_ms:
+            problems.append(f"{self.db_time_ms:.1f}ms in the database (budget {max_db_time_ms}ms)")
+        if max_repeats is not None:
+            problems.extend(
+                f"{count}x similar query (budget {max_repeats}): {sql[:200]}"
+                for sql, count in self.repeated(max_repeats + 1)
+            )
+        return problems
+
+
+@contextmanager
+def assert_query_budget(max_queries=None, max_db_time_ms=None, max_repeats=None):
+    """Test helper: fail with AssertionError when the block runs more than
+    ``max_queries`` queries, spends more than ``max_db_time_ms`` in the
+    database or repeats one statement more than ``max_repeats`` times.
+
+        with assert_query_budget(max_queries=8, max_repeats=1):
+            self.client.get(reverse("my_list"))
+    """
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    problems = recorder.violations(max_queries, max_db_time_ms, max_repeats)
+    if problems:
+        raise AssertionError("Query budget exceeded: " + "; ".join(problems))
+
+
+class QueryBudgetMiddleware:
+    """Record query count and database time per request, report them in a
+    Server-Timing header and log (or raise, with RAISE) when a request goes
+    over QUERY_BUDGET. Removed from the stack entirely when disabled."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = getattr(settings, "QUERY_BUDGET", {})
+        if not options.get("ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.max_queries = options.get("MAX_QUERIES")
+        self.max_db_time_ms = options.get("MAX_DB_TIME_MS")
+        self.max_repeats = options.get("MAX_REPEATS")
+        self.raise_errors = options.get("RAISE", False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.check(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        async with recorder.arecord():
+            response = await self.get_response(request)
+        return self.check(request, response, recorder)
+
+    def check(self, request, response, recorder):
+        timing = f'db;dur={recorder.db_time_ms:.1f};desc="{recorder.count} queries"'
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+
+        problems = recorder.violations(self.max_queries, self.max_db_time_ms, self.max_repeats)
+        if problems:
+            message = f"{request.method} {request.path} over query budget: " + "; ".join(problems)
+            if self.raise_errors:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'movie_recommendation.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'movie_recommendation.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'movie_recommendation.urls'
@@ -67,6 +69,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'movies.context_processors.fragment_cache',
             ],
         },
     },
@@ -96,6 +99,16 @@ DATABASES = {
     }
 }
 
+# DB_ENGINE=sqlite runs against a local SQLite file instead, e.g. for the
+# bench_recommender command.
+if os.getenv("DB_ENGINE") == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -145,4 +158,133 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/login'
-LOGIN_REDIRECT_URL = '/'
\ No newline at end of file
+LOGIN_REDIRECT_URL = '/'
+
+# Recommendations
+
+SIMILAR_MOVIES_TOP_K = int(os.getenv("SIMILAR_MOVIES_TOP_K", 20))
+RECOMMENDATION_REWEIGHT_THRESHOLD = float(os.getenv("RECOMMENDATION_REWEIGHT_THRESHOLD", 0.1))
+TASTE_PROFILE_HALF_LIFE_DAYS = float(os.getenv("TASTE_PROFILE_HALF_LIFE_DAYS", 0))
+TASTE_PROFILE_LIKE_WEIGHT = float(os.getenv("TASTE_PROFILE_LIKE_WEIGHT", 2.0))
+
+# "locmem" keeps an in-process LRU (development); "django" uses the cache
+# framework alias below, which is shared between workers (production).
+RECOMMENDATION_CACHE = {
+    "BACKEND": os.getenv("RECOMMENDATION_CACHE_BACKEND", "locmem"),
+    "CACHE_ALIAS": os.getenv("RECOMMENDATION_CACHE_ALIAS", "default"),
+    "TIMEOUT": int(os.getenv("RECOMMENDATION_CACHE_TIMEOUT", 300)),
+    "MAX_ENTRIES": int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", 10000)),
+}
+
+# "exact" scores every movie sharing a term with the query; "ann" re-ranks
+# only the candidates returned by the approximate backend below; "embedding"
+# scores the dense SVD embeddings written by build_embeddings.
+RECOMMENDATION_SEARCH_MODE = os.getenv("RECOMMENDATION_SEARCH_MODE", "exact")
+RECOMMENDATION_ANN = {
+    "BACKEND": "lsh",
+    "OPTIONS": {"n_tables": 8, "n_bits": 12, "probes": 2},
+}
+RECOMMENDATION_EMBEDDING_RANK = int(os.getenv("RECOMMENDATION_EMBEDDING_RANK", 128))
+
+# Directory for the on-disk, memory-mapped recommendation index written by
+# build_recommendation_index. When unset every process builds its own copy.
+# Only the management commands write versions; workers rebuild in memory.
+RECOMMENDATION_INDEX_DIR = os.getenv("RECOMMENDATION_INDEX_DIR")
+RECOMMENDATION_INDEX_KEEP_VERSIONS = int(os.getenv("RECOMMENDATION_INDEX_KEEP_VERSIONS", 3))
+RECOMMENDATION_REBUILD_RETRY_SECONDS = int(os.getenv("RECOMMENDATION_REBUILD_RETRY_SECONDS", 60))
+
+# BM25 parameters for the in-process movie search index.
+MOVIE_SEARCH = {"k1": 1.2, "b": 0.75, "title_weight": 3}
+MOVIE_SEARCH_PAGE_SIZE = int(os.getenv("MOVIE_SEARCH_PAGE_SIZE", 28))
+
+# The autocomplete index re-checks the catalog at most every CHECK_SECONDS
+# and rebuilds after REFRESH_SECONDS to pick up new view counts.
+AUTOCOMPLETE = {
+    "CHECK_SECONDS": int(os.getenv("AUTOCOMPLETE_CHECK_SECONDS", 5)),
+    "REFRESH_SECONDS": int(os.getenv("AUTOCOMPLETE_REFRESH_SECONDS", 300)),
+    "OPTIONS": {"limit": 10, "cached_prefix_length": 2},
+}
+
+# Popular movies are ranked from daily like/view buckets over the last
+# POPULARITY_WINDOW_DAYS days; the ranking table is refreshed in the
+# background once it is older than POPULARITY_REFRESH_SECONDS.
+POPULARITY_WINDOW_DAYS = int(os.getenv("POPULARITY_WINDOW_DAYS", 7))
+POPULARITY_REFRESH_SECONDS = int(os.getenv("POPULARITY_REFRESH_SECONDS", 300))
+POPULARITY_TABLE_SIZE = int(os.getenv("POPULARITY_TABLE_SIZE", 1000))
+
+# When enabled, UpdateHistory queues watch events and a background thread
+# writes them in batches every FLUSH_INTERVAL seconds (or BATCH_SIZE events).
+WATCH_EVENT_BUFFER = {
+    "ENABLED": os.getenv("WATCH_EVENT_BUFFER_ENABLED", "False") == "True",
+    "FLUSH_INTERVAL": float(os.getenv("WATCH_EVENT_FLUSH_INTERVAL", 1.0)),
+    "BATCH_SIZE": int(os.getenv("WATCH_EVENT_BATCH_SIZE", 500)),
+    "MAX_QUEUE": int(os.getenv("WATCH_EVENT_MAX_QUEUE", 10000)),
+}
+
+# View/like increments go to one of MOVIE_COUNTER_SHARDS rows per movie and
+# are folded into Movie.total_views/total_likes every
+# MOVIE_COUNTER_ROLLUP_SECONDS. 0 updates the Movie row directly.
+MOVIE_COUNTER_SHARDS = int(os.getenv("MOVIE_COUNTER_SHARDS", 8))
+MOVIE_COUNTER_ROLLUP_SECONDS = int(os.getenv("MOVIE_COUNTER_ROLLUP_SECONDS", 60))
+
+# ASGI deployment profile: set DJANGO_ASGI=True when serving asgi.py, e.g.
+# `uvicorn movie_recommendation.asgi:application --workers 4`. The like,
+# watch-history and my-list endpoints then use their async views.
+# Persistent connections are off by default there, as Django recommends:
+# sync ORM calls run in a fresh executor thread per request, and each thread
+# opens its own connection, so a non-zero CONN_MAX_AGE leaves idle
+# connections behind instead of reusing them. Use a pooler (PgBouncer, or
+# OPTIONS["pool"] with psycopg 3) rather than raising DB_CONN_MAX_AGE.
+ASGI_DEPLOYMENT = os.getenv("DJANGO_ASGI", "False") == "True"
+ASYNC_INTERACTION_VIEWS = os.getenv("ASYNC_INTERACTION_VIEWS", str(ASGI_DEPLOYMENT)) == "True"
+if ASGI_DEPLOYMENT:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", 0))
+
+# Per-request query budget, checked by QueryBudgetMiddleware. MAX_REPEATS is
+# how often one statement may run with different parameters before it is
+# reported as a likely N+1 loop.
+QUERY_BUDGET = {
+    "ENABLED": os.getenv("QUERY_BUDGET_ENABLED", str(DEBUG)) == "True",
+    "MAX_QUERIES": int(os.getenv("QUERY_BUDGET_MAX_QUERIES", 30)),
+    "MAX_DB_TIME_MS": float(os.getenv("QUERY_BUDGET_MAX_DB_TIME_MS", 200)),
+    "MAX_REPEATS": int(os.getenv("QUERY_BUDGET_MAX_REPEATS", 3)),
+    "RAISE": os.getenv("QUERY_BUDGET_RAISE", "False") == "True",
+}
+
+# In-process request and recommender stage metrics, served in the
+# Prometheus text format at /metrics. Off by default; when disabled the
+# middleware is removed and stage spans are no-ops.
+METRICS = {
+    "ENABLED": os.getenv("METRICS_ENABLED", "False") == "True",
+}
+
+# Lifetime of cached template fragments (home rows and movie cards). Keys
+# also carry the catalog version, so edits show up before they expire.
+TEMPLATE_FRAGMENT_CACHE_TIMEOUT = int(os.getenv("TEMPLATE_FRAGMENT_CACHE_TIMEOUT", 600))
+
+# The default locmem caches are per process. With several workers, point
+# CACHE_BACKEND and CACHE_LOCATION at a shared cache, e.g.
+# django.core.cache.backends.redis.RedisCache and redis://localhost:6379/1,
+# so a fragment rendered by one worker is reused by all. Fragment keys carry
+# the content versions from the database, so either way no worker serves a
+# stale fragment. {% cache %} uses the "template_fragments" alias, which
+# keeps a page of movie cards from evicting everything else.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache")
+CACHE_LOCATION = os.getenv("CACHE_LOCATION", "")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": CACHE_LOCATION,
+    },
+    "template_fragments": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": CACHE_LOCATION or "template-fragments",
+        "KEY_PREFIX": "fragments",
+    },
+}
+if CACHE_BACKEND.endswith("LocMemCache"):
+    CACHES["template_fragments"]["OPTIONS"] = {"MAX_ENTRIES": int(os.getenv("TEMPLATE_FRAGMENT_CACHE_MAX_ENTRIES", 10000))}
+
+# Answer conditional GETs on the home, genre and new-release pages and on
+# autocomplete with 304 when the catalog and viewer stamps are unchanged.
+CONDITIONAL_GET = os.getenv("CONDITIONAL_GET", "True") == "True"
@@ -0,0 +1,10 @@
+"""Settings for the test suite:
+
+    DB_ENGINE=sqlite python manage.py test --settings=movie_recommendation.test_settings
+
+The apps ship without migrations, so the test database is built straight
+from the models.
+"""
+from movie_recommendation.settings import *  # noqa: F401,F403
+
+MIGRATION_MODULES = {"movies": None, "core": None}
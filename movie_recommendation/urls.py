@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from movie_recommendation.metrics import metrics_view
 
 admin.site.site_header = "Movie Recommendation System"
 admin.site.site_title = "Movie Recommendation System"
@@ -26,6 +27,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path("", include("core.urls")),
     path("movies/", include("movies.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 
@@ -1,17 +1,25 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.urls import reverse
 from .models import Movie, Genre, Language
 from django.utils.html import format_html
 # import nltk
 # nltk.download('wordnet')
 # nltk.download('stopwords')
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
+from .tokenizer import movie_tags
 
 class GenreAdmin(admin.ModelAdmin):
     list_display = ('name', 'total_movies', 'delete_button')
     search_fields = ('name',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(movie_count=Count('movies'))
+
+    def total_movies(self, obj):
+        return obj.movie_count
+    total_movies.short_description = 'Total movies'
+    total_movies.admin_order_field = 'movie_count'
+
     def delete_button(self, obj):
         delete_url = reverse(f'admin:{obj._meta.app_label}_{obj._meta.model_name}_delete', args=[obj.pk])
         return format_html(
@@ -39,6 +47,9 @@ class MovieAdmin(admin.ModelAdmin):
     filter_horizontal = ('genres',)
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genres')
+
     def display_poster(self, obj):
         return format_html('<img src="{}" width="60" />', obj.poster.url)
     display_poster.short_description = 'Poster'
@@ -57,11 +68,7 @@ class MovieAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
-        genres = " ".join(genre.name for genre in obj.genres.all())
-        stop_words = set(stopwords.words("english"))
-        tags = (f"{obj.description} {genres} {obj.language}")
-        ps = PorterStemmer()
-        obj.tags = " ".join(ps.stem(tag) for tag in tags.lower().split() if tag not in stop_words)
+        obj.tags = movie_tags(obj)
         obj.save()
 
 admin.site.register(Genre, GenreAdmin)
@@ -0,0 +1,114 @@
+import time
+import numpy as np
+from django.conf import settings
+
+
+def segment_sums(values, starts, lengths) -> np.ndarray:
+    sums = np.zeros((len(starts),) + values.shape[1:], dtype=values.dtype)
+    present = lengths > 0
+    if present.any():
+        sums[present] = np.add.reduceat(values, starts[present], axis=0)
+    return sums
+
+
+class RandomHyperplaneLSH:
+    """Cosine LSH: each table hashes a row to the sign pattern of ``n_bits``
+    random projections. Candidates from the query's buckets (plus ``probes``
+    extra buckets that flip the least certain bits) are re-ranked exactly.
+    """
+
+    def __init__(self, index, n_tables=8, n_bits=12, probes=2, seed=42, chunk_rows=50000):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.probes = probes
+        self.n_rows = index.base_rows
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((len(index.vocabulary), n_tables * n_bits)).astype(np.float32)
+        self.bit_values = 1 << np.arange(n_bits, dtype=np.int64)
+
+        codes = np.empty((self.n_rows, n_tables), dtype=np.int64)
+        for start in range(0, self.n_rows, chunk_rows):
+            end = min(start + chunk_rows, self.n_rows)
+            lo, hi = index.indptr[start], index.indptr[end]
+            contributions = index.data[lo:hi, None] * self.planes[index.indices[lo:hi]]
+            row_starts = index.indptr[start:end] - lo
+            lengths = np.diff(index.indptr[start:end + 1])
+            projections = segment_sums(contributions, row_starts, lengths)
+            codes[start:end] = self._codes(projections)
+
+        self.tables = []
+        for table in range(n_tables):
+            order = np.argsort(codes[:, table], kind="stable")
+            sorted_codes = codes[order, table]
+            boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+            starts = np.concatenate(([0], boundaries)).astype(np.int64)
+            keys = sorted_codes[starts].tolist() if self.n_rows else []
+            self.tables.append(dict(zip(keys, np.split(order, boundaries))))
+
+    def _codes(self, projections) -> np.ndarray:
+        bits = (projections > 0).reshape(len(projections), self.n_tables, self.n_bits)
+        return bits @ self.bit_values
+
+    def candidates(self, indices, data) -> np.ndarray:
+        known = indices < len(self.planes)
+        indices, data = indices[known], data[known]
+        projection = (data[:, None] * self.planes[indices]).sum(axis=0)
+        per_table = projection.reshape(self.n_tables, self.n_bits)
+        codes = (per_table > 0) @ self.bit_values
+        uncertain = np.argsort(np.abs(per_table), axis=1)[:, :self.probes]
+
+        found = []
+        for table, buckets in enumerate(self.tables):
+            probe_codes = [codes[table]] + [codes[table] ^ self.bit_values[bit] for bit in uncertain[table]]
+            for code in probe_codes:
+                rows = buckets.get(int(code))
+                if rows is not None:
+                    found.append(rows)
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+
+ANN_BACKENDS = {
+    "lsh": RandomHyperplaneLSH,
+}
+
+
+def build_ann_backend(index, name=None, **options):
+    config = getattr(settings, "RECOMMENDATION_ANN", {})
+    name = name or config.get("BACKEND", "lsh")
+    options = {**config.get("OPTIONS", {}), **options}
+    return ANN_BACKENDS[name](index, **options)
+
+
+def recall_at_k(index, backend, k=10, sample=200, seed=0) -> dict:
+    rng = np.random.default_rng(seed)
+    movie_ids = np.array(list(index.movie_id_to_row), dtype=np.int64)
+    if len(movie_ids) > sample:
+        movie_ids = rng.choice(movie_ids, sample, replace=False)
+
+    recalls = []
+    exact_seconds = 0.0
+    ann_seconds = 0.0
+    for movie_id in movie_ids.tolist():
+        started = time.perf_counter()
+        exact = index.similar(movie_id, k, mode="exact")
+        exact_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        approximate = index.similar(movie_id, k, mode="ann", backend=backend)
+        ann_seconds += time.perf_counter() - started
+
+        relevant = {neighbor_id for neighbor_id, score in exact if score > 0}
+        if relevant:
+            found = {neighbor_id for neighbor_id, _ in approximate}
+            recalls.append(len(relevant & found) / len(relevant))
+
+    queries = max(len(movie_ids), 1)
+    return {
+        "k": k,
+        "queries": len(movie_ids),
+        "recall": float(np.mean(recalls)) if recalls else 1.0,
+        "exact_ms": exact_seconds / queries * 1000,
+        "ann_ms": ann_seconds / queries * 1000,
+    }
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class MoviesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movies'
+
+    def ready(self):
+        from movie_recommendation.metrics import registry
+        from movies import signals  # noqa: F401
+        from movies.cache import collect_cache_metrics
+
+        registry.add_collector(collect_cache_metrics)
@@ -0,0 +1,129 @@
+import bisect
+import hashlib
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from django.conf import settings
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils.http import urlencode
+from movies.models import Genre, Language, Movie
+from movies.recommendation import catalog_signature
+
+NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize(text) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return NON_WORD.sub(" ", text.lower()).strip()
+
+
+class AutocompleteIndex:
+    """Sorted array of normalized keys searched with bisect.
+
+    Every suggestion is stored under its full name and under each later word
+    of it, so "knight" finds "The Dark Knight". A prefix lookup is a bisect
+    range over ``keys``. Short prefixes match huge ranges, so the best
+    suggestions for every prefix up to ``cached_prefix_length`` characters
+    are precomputed, and longer prefixes with wide ranges are memoized the
+    first time they are looked up.
+    """
+
+    MEMOIZE_RANGE = 1000
+
+    def __init__(self, suggestions, limit=10, cached_prefix_length=2):
+        self.suggestions = suggestions
+        self.limit = limit
+        self.cached_prefix_length = cached_prefix_length
+        entries = []
+        for position, suggestion in enumerate(suggestions):
+            words = normalize(suggestion["label"]).split()
+            for start in range(len(words)):
+                entries.append((" ".join(words[start:]), position))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.positions = [position for _, position in entries]
+        self.built_at = time.monotonic()
+        self.signature = None
+        # Identifies the suggestions themselves, so workers that built equal
+        # indexes agree on it. Used as the autocomplete ETag.
+        digest = hashlib.md5(usedforsecurity=False)
+        for suggestion in suggestions:
+            digest.update(repr(sorted(suggestion.items())).encode())
+        self.digest = digest.hexdigest()
+        self.top = {}
+        for length in range(1, cached_prefix_length + 1):
+            prefixes = {key[:length] for key in self.keys if len(key) >= length}
+            for prefix in prefixes:
+                self.top[prefix] = self._scan(prefix, limit)
+
+    @classmethod
+    def from_catalog(cls, **options):
+        signature = catalog_signature()
+        suggestions = [
+            {"type": "movie", "label": title, "url": reverse("watch", args=[movie_id]), "views": views}
+            for movie_id, title, views in Movie.objects.values_list("id", "title", "total_views").iterator(chunk_size=2000)
+        ]
+        genres = Genre.objects.annotate(views=Sum("movies__total_views")).filter(views__isnull=False)
+        suggestions += [
+            {"type": "genre", "label": genre.name, "url": reverse("movie_list_by_genre", args=[genre.pk]), "views": genre.views}
+            for genre in genres
+        ]
+        languages = Language.objects.annotate(views=Sum("movies__total_views")).filter(views__isnull=False)
+        suggestions += [
+            {"type": "language", "label": language.name, "url": f"{reverse('movies')}?{urlencode({'search': language.name})}", "views": language.views}
+            for language in languages
+        ]
+        index = cls(suggestions, **options)
+        index.signature = signature
+        return index
+
+    def _scan(self, prefix, limit) -> list:
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\U0010ffff", lo)
+        positions = set(self.positions[lo:hi])
+        best = heapq.nlargest(limit, positions, key=lambda position: (self.suggestions[position]["views"], -position))
+        if hi - lo > self.MEMOIZE_RANGE:
+            self.top[prefix] = best
+        return best
+
+    def lookup(self, query, limit=None) -> list:
+        prefix = normalize(query)
+        limit = self.limit if limit is None else max(min(limit, self.limit), 0)
+        if not prefix or not limit:
+            return []
+        positions = self.top.get(prefix)
+        if positions is None:
+            positions = self._scan(prefix, self.limit)
+        return [self.suggestions[position] for position in positions[:limit]]
+
+
+_autocomplete_index = None
+_autocomplete_checked_at = 0.0
+_autocomplete_lock = threading.Lock()
+
+
+def get_autocomplete_index() -> AutocompleteIndex:
+    """Return the process-wide index, checking the catalog signature at most
+    every AUTOCOMPLETE_CHECK_SECONDS and rebuilding when it changed or the
+    view counts are older than AUTOCOMPLETE_REFRESH_SECONDS."""
+    global _autocomplete_index, _autocomplete_checked_at
+    config = getattr(settings, "AUTOCOMPLETE", {})
+    now = time.monotonic()
+    index = _autocomplete_index
+    if index is not None and now - _autocomplete_checked_at < config.get("CHECK_SECONDS", 5):
+        return index
+    with _autocomplete_lock:
+        index = _autocomplete_index
+        if (
+            index is None
+            or index.signature != catalog_signature()
+            or now - index.built_at > config.get("REFRESH_SECONDS", 300)
+        ):
+            index = AutocompleteIndex.from_catalog(**config.get("OPTIONS", {}))
+            _autocomplete_index = index
+        _autocomplete_checked_at = now
+        return index
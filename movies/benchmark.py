@@ -0,0 +1,152 @@
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from django.contrib.auth.models import User
+from django.db import transaction
+from movie_recommendation.query_budget import QueryRecorder
+from movies.models import Genre, Language, Like, Movie, View, WatchHistory
+from movies.popularity import backfill_daily_stats, refresh_popularity
+
+WORDS = [
+    "night", "river", "shadow", "empire", "storm", "garden", "secret", "silver", "winter", "city",
+    "dragon", "island", "queen", "ghost", "summer", "fire", "ocean", "road", "star", "machine",
+    "love", "war", "house", "dream", "iron", "forest", "mirror", "heart", "code", "desert",
+    "last", "lost", "dark", "golden", "broken", "hidden", "wild", "final", "silent", "red",
+]
+# Settings for the throwaway databases the benchmark commands run in: create
+# tables straight from the models, accept the test client's host, keep index
+# versions off disk and never refresh popularity in a background thread while
+# timing.
+BENCHMARK_SETTINGS = {
+    "ALLOWED_HOSTS": ["testserver"],
+    "MIGRATION_MODULES": {"movies": None, "core": None},
+    "RECOMMENDATION_INDEX_DIR": None,
+    "POPULARITY_REFRESH_SECONDS": 10**9,
+}
+SYLLABLES = ["ka", "lo", "mi", "ren", "sa", "tor", "vi", "ul", "pe", "dan", "go", "zhi", "ma", "rit", "ef", "no"]
+
+
+def zipf_weights(n, exponent=1.0) -> list:
+    """Cumulative weights for ``random.choices`` where item ``i`` is drawn
+    proportionally to 1 / (i + 1) ** exponent."""
+    total = 0.0
+    cumulative = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def generate_catalog(movies, genres, languages, users, watches, likes, views, tags_per_movie=30, vocabulary=4096, seed=0) -> dict:
+    """Fill an empty database with a synthetic catalog and event history.
+
+    Everything is drawn from one ``random.Random(seed)``, so the same counts
+    and seed always produce the same rows. Tags and events follow Zipf
+    distributions, like real tags and real audiences do. Counters, daily
+    buckets and the popularity table are brought up to date at the end.
+    """
+    rng = random.Random(seed)
+    terms = ["".join(rng.choice(SYLLABLES) for _ in range(3)) for _ in range(vocabulary)]
+    term_weights = zipf_weights(len(terms))
+
+    with transaction.atomic():
+        genre_rows = Genre.objects.bulk_create([Genre(name=f"Genre {number}") for number in range(genres)])
+        language_rows = Language.objects.bulk_create([Language(name=f"Language {number}") for number in range(languages)])
+        movie_rows = Movie.objects.bulk_create([
+            Movie(
+                title=" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title() + f" {number}",
+                description=" ".join(rng.choice(WORDS) for _ in range(20)),
+                youtube_id=f"bench{number}",
+                poster="posters/bench.jpg",
+                duration=rng.randint(70, 180),
+                language=rng.choice(language_rows),
+                tags=" ".join(rng.choices(terms, cum_weights=term_weights, k=rng.randint(tags_per_movie // 2, tags_per_movie))),
+            )
+            for number in range(movies)
+        ], batch_size=1000)
+        Movie.genres.through.objects.bulk_create([
+            Movie.genres.through(movie_id=movie.id, genre_id=genre.id)
+            for movie in movie_rows
+            for genre in rng.sample(genre_rows, min(len(genre_rows), rng.randint(1, 3)))
+        ], batch_size=1000)
+        user_rows = User.objects.bulk_create(
+            [User(username=f"bench-user-{number}", password="!") for number in range(users)], batch_size=1000
+        )
+
+        # Audiences favour a few hits: movie popularity is Zipf over a
+        # shuffled order, so hits are not simply the oldest movies.
+        audience = movie_rows[:]
+        rng.shuffle(audience)
+        movie_weights = zipf_weights(len(audience))
+        user_weights = zipf_weights(len(user_rows), 0.5)
+
+        def draw(k):
+            return zip(
+                rng.choices(user_rows, cum_weights=user_weights, k=k),
+                rng.choices(audience, cum_weights=movie_weights, k=k),
+            )
+
+        WatchHistory.objects.bulk_create(
+            [WatchHistory(user=user, movie=movie) for user, movie in draw(watches)], batch_size=1000
+        )
+        liked = dict.fromkeys((user.id, movie.id) for user, movie in draw(likes))
+        Like.objects.bulk_create(
+            [Like(user_id=user_id, movie_id=movie_id) for user_id, movie_id in liked], batch_size=1000
+        )
+        viewed = [(user.id, movie.id) for user, movie in draw(views)]
+        View.objects.bulk_create([
+            View(user_id=user_id, movie_id=movie_id, user_ip=f"10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}")
+            for number, (user_id, movie_id) in enumerate(viewed)
+        ], batch_size=1000)
+
+        like_counts = Counter(movie_id for _, movie_id in liked)
+        view_counts = Counter(movie_id for _, movie_id in viewed)
+        for movie in movie_rows:
+            movie.total_likes = like_counts[movie.id]
+            movie.total_views = view_counts[movie.id]
+        Movie.objects.bulk_update(movie_rows, ["total_likes", "total_views"], batch_size=1000)
+
+    backfill_daily_stats()
+    refresh_popularity()
+    return {
+        "movies": len(movie_rows),
+        "genres": len(genre_rows),
+        "languages": len(language_rows),
+        "users": len(user_rows),
+        "watches": watches,
+        "likes": len(liked),
+        "views": len(viewed),
+    }
+
+
+def measure(call, repeat=20, warmup=1) -> dict:
+    """Time ``repeat`` calls of ``call(iteration)`` after ``warmup`` untimed
+    ones, then make one more call to count its queries and peak traced
+    memory, so tracing never inflates the latencies."""
+    for iteration in range(warmup):
+        call(iteration)
+    latencies = []
+    for iteration in range(repeat):
+        started = time.perf_counter()
+        call(warmup + iteration)
+        latencies.append(time.perf_counter() - started)
+
+    recorder = QueryRecorder()
+    tracemalloc.start()
+    try:
+        with recorder.record():
+            call(warmup + repeat)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "runs": repeat,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": statistics.quantiles(latencies, n=20, method="inclusive")[-1] * 1000,
+        "max_ms": max(latencies) * 1000,
+        "queries": recorder.count,
+        "db_time_ms": recorder.db_time_ms,
+        "peak_memory_kib": peak / 1024,
+    }
@@ -0,0 +1,249 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from movies.models import ContentVersion
+
+
+class LocMemLRUBackend:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = OrderedDict()
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _version(self, name) -> int:
+        # Counters are evicted like entries. Every value comes from one
+        # process-wide clock, so a counter seen again after eviction starts
+        # above anything old entries were stored under.
+        version = self._versions.get(name)
+        if version is None:
+            self._clock += 1
+            version = self._versions[name] = self._clock
+            while len(self._versions) > self.max_entries:
+                self._versions.popitem(last=False)
+        self._versions.move_to_end(name)
+        return version
+
+    def get_version(self, name) -> int:
+        with self._lock:
+            return self._version(name)
+
+    def incr_version(self, name) -> int:
+        with self._lock:
+            self._version(name)
+            self._clock += 1
+            self._versions[name] = self._clock
+            return self._clock
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    def __init__(self, alias="default"):
+        self.cache = caches[alias]
+        self.evictions = None
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout or None)
+
+    def get_version(self, name) -> int:
+        # Seed counters from the clock so a counter lost to eviction never
+        # restarts at a value that old entries were stored under.
+        self.cache.add(name, time.time_ns(), None)
+        return self.cache.get(name, 0)
+
+    def incr_version(self, name) -> int:
+        self.cache.add(name, time.time_ns(), None)
+        try:
+            return self.cache.incr(name)
+        except ValueError:
+            self.cache.set(name, time.time_ns(), None)
+            return self.cache.get(name)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class RecommendationCache:
+    CATALOG_VERSION_KEY = "recommendations:version:catalog"
+
+    def __init__(self, backend, timeout=300):
+        self.backend = backend
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def _user_version_key(self, user_id) -> str:
+        return f"recommendations:version:user:{user_id}"
+
+    def _key(self, name, user_id, *parts) -> str:
+        user_version = self.backend.get_version(self._user_version_key(user_id))
+        catalog_version = self.backend.get_version(self.CATALOG_VERSION_KEY)
+        suffix = ":".join(str(part) for part in parts)
+        return f"recommendations:{name}:{user_id}:{user_version}:{catalog_version}:{suffix}"
+
+    def get(self, name, user_id, *parts):
+        value = self.backend.get(self._key(name, user_id, *parts))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, name, user_id, *parts, value):
+        self.backend.set(self._key(name, user_id, *parts), value, self.timeout)
+
+    def bump_user(self, user_id):
+        self.backend.incr_version(self._user_version_key(user_id))
+
+    def bump_catalog(self):
+        self.backend.incr_version(self.CATALOG_VERSION_KEY)
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "timeout": self.timeout,
+        }
+
+
+def collect_cache_metrics():
+    """Hit, miss and eviction counts of this process's recommendation cache,
+    registered as a /metrics collector."""
+    cache = _recommendation_cache
+    if cache is None:
+        return
+    stats = cache.stats()
+    labels = (("backend", stats["backend"]),)
+    yield "movie_recommendation_cache_hits_total", "Recommendation cache hits.", "counter", [(labels, stats["hits"])]
+    yield "movie_recommendation_cache_misses_total", "Recommendation cache misses.", "counter", [(labels, stats["misses"])]
+    if stats["evictions"] is not None:
+        yield (
+            "movie_recommendation_cache_evictions_total",
+            "Recommendation cache entries evicted to stay under MAX_ENTRIES.",
+            "counter",
+            [(labels, stats["evictions"])],
+        )
+
+
+def _create_recommendation_cache() -> RecommendationCache:
+    options = getattr(settings, "RECOMMENDATION_CACHE", {})
+    if options.get("BACKEND", "locmem") == "django":
+        backend = DjangoCacheBackend(options.get("CACHE_ALIAS", "default"))
+    else:
+        backend = LocMemLRUBackend(options.get("MAX_ENTRIES", 10000))
+    return RecommendationCache(backend, options.get("TIMEOUT", 300))
+
+
+_recommendation_cache = None
+_recommendation_cache_lock = threading.Lock()
+
+
+def get_recommendation_cache() -> RecommendationCache:
+    global _recommendation_cache
+    if _recommendation_cache is None:
+        with _recommendation_cache_lock:
+            if _recommendation_cache is None:
+                _recommendation_cache = _create_recommendation_cache()
+    return _recommendation_cache
+
+
+CATALOG = "catalog"
+POPULARITY = "popularity"
+
+
+def get_content_versions(request=None) -> dict:
+    """{name: (version, bumped_at)} of every content version, in one query.
+    Given a request, the versions are read once and reused for the rest of
+    it, so the ETag and the rendered fragments always agree."""
+    if request is not None:
+        versions = getattr(request, "_content_versions", None)
+        if versions is None:
+            versions = request._content_versions = get_content_versions()
+        return versions
+    return {
+        name: (version, bumped_at)
+        for name, version, bumped_at in ContentVersion.objects.values_list("name", "version", "bumped_at")
+    }
+
+
+def get_catalog_version(request=None) -> int:
+    """Version of everything rendered from movies, genres and languages."""
+    return get_content_versions(request).get(CATALOG, (0, None))[0]
+
+
+def get_popularity_version(request=None) -> int:
+    """Version of the popularity ranking's order."""
+    return get_content_versions(request).get(POPULARITY, (0, None))[0]
+
+
+def get_catalog_last_modified(request=None):
+    """When the catalog version was last bumped, or None before the first
+    bump."""
+    return get_content_versions(request).get(CATALOG, (0, None))[1]
+
+
+def bump_content_version(name):
+    now = timezone.now()
+    rows = ContentVersion.objects.filter(name=name)
+    if rows.update(version=F("version") + 1, bumped_at=now):
+        return
+    try:
+        with transaction.atomic():
+            ContentVersion.objects.create(name=name, version=1, bumped_at=now)
+    except IntegrityError:
+        rows.update(version=F("version") + 1, bumped_at=now)
+
+
+def bump_catalog_version():
+    bump_content_version(CATALOG)
+
+
+def bump_popularity_version():
+    bump_content_version(POPULARITY)
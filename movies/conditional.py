@@ -0,0 +1,96 @@
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from movies.autocomplete import get_autocomplete_index
+from movies.cache import (
+    CATALOG,
+    POPULARITY,
+    get_catalog_last_modified,
+    get_catalog_version,
+    get_content_versions,
+    get_popularity_version,
+)
+from movies.models import UserTasteProfile
+
+
+def _digest(*parts) -> str:
+    return hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def viewer_stamp(request) -> str:
+    """Everything per-viewer that base.html renders: the navbar's name and
+    the CSRF secret behind its logout form."""
+    user = request.user
+    if not user.is_authenticated:
+        return "anonymous"
+    return _digest(user.pk, user.username, user.first_name, request.META.get("CSRF_COOKIE"))
+
+
+def for_you_version(request) -> str:
+    """Changes whenever the viewer's taste profile is saved. Read from the
+    database, so every worker agrees on it; once per request."""
+    version = getattr(request, "_for_you_version", None)
+    if version is None:
+        updated_at = UserTasteProfile.objects.filter(user=request.user).values_list("updated_at", flat=True).first()
+        version = request._for_you_version = updated_at.isoformat() if updated_at else "none"
+    return version
+
+
+# Validators are built only from state in the database, so every worker
+# computes the same ones and changes made by other processes (imports,
+# retagging, popularity refreshes) show up on the next request.
+
+
+def catalog_etag(request, *args, **kwargs) -> str:
+    return f"catalog-{get_catalog_version(request)}-{viewer_stamp(request)}"
+
+
+def home_etag(request, *args, **kwargs) -> str:
+    etag = f"home-{get_catalog_version(request)}.{get_popularity_version(request)}-{viewer_stamp(request)}"
+    if request.user.is_authenticated:
+        etag += f"-{_digest(for_you_version(request))}"
+    return etag
+
+
+# Only anonymous pages carry a date: an If-Modified-Since check cannot tell
+# viewers apart, so personalized pages are validated by ETag alone.
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    if request.user.is_authenticated:
+        return None
+    return get_catalog_last_modified(request)
+
+
+def home_last_modified(request, *args, **kwargs):
+    if request.user.is_authenticated:
+        return None
+    versions = get_content_versions(request)
+    return max((versions[name][1] for name in (CATALOG, POPULARITY) if name in versions), default=None)
+
+
+def autocomplete_etag(request, *args, **kwargs) -> str:
+    return f"autocomplete-{get_autocomplete_index().digest}"
+
+
+def revalidate(etag_func, last_modified_func=None):
+    """Answer matching conditional GETs with 304 before the view runs, and
+    mark responses no-cache so browsers and CDNs revalidate every time
+    instead of guessing a freshness lifetime from Last-Modified."""
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not getattr(settings, "CONDITIONAL_GET", True):
+                return view(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, no_cache=True, private=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from movies.cache import get_catalog_version, get_popularity_version
+
+
+def fragment_cache(request):
+    """Values used in {% cache %} keys. The versions are only looked up by
+    templates that actually use them."""
+    return {
+        "catalog_version": SimpleLazyObject(lambda: get_catalog_version(request)),
+        "popularity_version": SimpleLazyObject(lambda: get_popularity_version(request)),
+        "fragment_timeout": getattr(settings, "TEMPLATE_FRAGMENT_CACHE_TIMEOUT", 600),
+    }
@@ -0,0 +1,116 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Sum
+from movies.models import Movie, MovieCounterShard
+
+logger = logging.getLogger(__name__)
+
+
+def shard_count() -> int:
+    return getattr(settings, "MOVIE_COUNTER_SHARDS", 8)
+
+
+def add_to_counters(movie_id, views=0, likes=0):
+    """Add ``views``/``likes`` (which may be negative) to one random shard of
+    the movie's counters, so concurrent writers rarely touch the same row.
+    With MOVIE_COUNTER_SHARDS = 0 the Movie columns are updated directly."""
+    shards = shard_count()
+    if not shards:
+        Movie.objects.filter(pk=movie_id).update(total_views=F("total_views") + views, total_likes=F("total_likes") + likes)
+        return
+    shard = random.randrange(shards)
+    rows = MovieCounterShard.objects.filter(movie_id=movie_id, shard=shard)
+    if not rows.update(views=F("views") + views, likes=F("likes") + likes):
+        try:
+            with transaction.atomic():
+                MovieCounterShard.objects.create(movie_id=movie_id, shard=shard, views=views, likes=likes)
+        except IntegrityError:
+            rows.update(views=F("views") + views, likes=F("likes") + likes)
+    rollup_counters_if_due()
+
+
+def get_counters(movie_ids, exact=True) -> dict:
+    """Return {movie_id: (total_views, total_likes)}. The approximate read is
+    the denormalized Movie columns as of the last rollup; the exact read adds
+    the shard deltas that have not been rolled up yet."""
+    counters = {
+        movie_id: [views, likes]
+        for movie_id, views, likes in Movie.objects.filter(pk__in=movie_ids).values_list("id", "total_views", "total_likes")
+    }
+    if exact:
+        pending = (
+            MovieCounterShard.objects.filter(movie_id__in=counters)
+            .values("movie_id")
+            .annotate(views=Sum("views"), likes=Sum("likes"))
+            .order_by()
+        )
+        for row in pending:
+            counter = counters[row["movie_id"]]
+            counter[0] += row["views"]
+            counter[1] += row["likes"]
+    return {movie_id: (max(views, 0), max(likes, 0)) for movie_id, (views, likes) in counters.items()}
+
+
+def get_movie_counters(movie_id, exact=True) -> tuple:
+    return get_counters([movie_id], exact).get(movie_id, (0, 0))
+
+
+def rollup_counters(batch_size=1000) -> int:
+    """Fold shard deltas into Movie.total_views/total_likes and delete the
+    folded shards. Shards are locked while they are read, so increments that
+    race the rollup wait for it and then recreate their shard."""
+    rolled = 0
+    while True:
+        with transaction.atomic():
+            shards = list(
+                MovieCounterShard.objects.select_for_update()
+                .order_by("id")
+                .values_list("id", "movie_id", "views", "likes")[:batch_size]
+            )
+            if not shards:
+                return rolled
+            totals = defaultdict(lambda: [0, 0])
+            for _, movie_id, views, likes in shards:
+                totals[movie_id][0] += views
+                totals[movie_id][1] += likes
+            for movie_id, (views, likes) in totals.items():
+                if views or likes:
+                    Movie.objects.filter(pk=movie_id).update(
+                        total_views=F("total_views") + views, total_likes=F("total_likes") + likes
+                    )
+            MovieCounterShard.objects.filter(id__in=[shard_id for shard_id, *_ in shards]).delete()
+            rolled += len(shards)
+
+
+_rolled_up_at = 0.0
+_rollup_thread = None
+_rollup_lock = threading.Lock()
+
+
+def _run_background_rollup():
+    try:
+        rollup_counters()
+    except Exception:
+        logger.exception("Background counter rollup failed.")
+    finally:
+        connections.close_all()
+
+
+def rollup_counters_if_due():
+    """Start a background rollup at most every MOVIE_COUNTER_ROLLUP_SECONDS."""
+    global _rolled_up_at, _rollup_thread
+    interval = getattr(settings, "MOVIE_COUNTER_ROLLUP_SECONDS", 60)
+    if not shard_count() or time.monotonic() - _rolled_up_at < interval:
+        return
+    with _rollup_lock:
+        if time.monotonic() - _rolled_up_at < interval:
+            return
+        _rolled_up_at = time.monotonic()
+        if _rollup_thread is None or not _rollup_thread.is_alive():
+            _rollup_thread = threading.Thread(target=_run_background_rollup, name="counter-rollup", daemon=True)
+            _rollup_thread.start()
@@ -0,0 +1,196 @@
+import threading
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from movies.ann import segment_sums
+from movies.index_store import current_index_version, load_index, split_arrays
+from movies.models import MovieEmbedding
+from movies.recommendation import get_index, top_k
+
+
+def csr_dot(index, dense, chunk_rows=20000) -> np.ndarray:
+    result = np.zeros((len(index), dense.shape[1]), dtype=np.float32)
+    for start in range(0, len(index), chunk_rows):
+        end = min(start + chunk_rows, len(index))
+        lo, hi = index.indptr[start], index.indptr[end]
+        contributions = index.data[lo:hi, None] * dense[index.indices[lo:hi]]
+        result[start:end] = segment_sums(contributions, index.indptr[start:end] - lo, np.diff(index.indptr[start:end + 1]))
+    return result
+
+
+def csc_dot(index, dense, chunk_terms=20000) -> np.ndarray:
+    # Uses the posting lists, so rows appended since the last reweight are
+    # not included.
+    n_terms = len(index.posting_ptr) - 1
+    result = np.zeros((len(index.vocabulary), dense.shape[1]), dtype=np.float32)
+    for start in range(0, n_terms, chunk_terms):
+        end = min(start + chunk_terms, n_terms)
+        lo, hi = index.posting_ptr[start], index.posting_ptr[end]
+        contributions = index.posting_data[lo:hi, None] * dense[index.posting_rows[lo:hi]]
+        result[start:end] = segment_sums(contributions, index.posting_ptr[start:end] - lo, np.diff(index.posting_ptr[start:end + 1]))
+    return result
+
+
+def randomized_svd(index, rank, n_oversamples=10, n_iter=4, seed=0) -> np.ndarray:
+    """Return the rank-``rank`` row embeddings U * S of the TF-IDF matrix."""
+    size = min(rank + n_oversamples, len(index), len(index.vocabulary))
+    rng = np.random.default_rng(seed)
+    omega = rng.standard_normal((len(index.vocabulary), size)).astype(np.float32)
+    q, _ = np.linalg.qr(csr_dot(index, omega))
+    for _ in range(n_iter):
+        z, _ = np.linalg.qr(csc_dot(index, q))
+        q, _ = np.linalg.qr(csr_dot(index, z))
+    b = csc_dot(index, q).T
+    u, s, _ = np.linalg.svd(b, full_matrices=False)
+    rank = min(rank, len(s))
+    return ((q @ u[:, :rank]) * s[:rank]).astype(np.float32)
+
+
+def build_movie_embeddings(index=None, rank=None, batch_size=1000, **options) -> int:
+    if index is None:
+        index = get_index()
+    if index.base_rows < len(index) or not index.alive.all():
+        index = index.copy()
+        index.reweight()
+    if rank is None:
+        rank = getattr(settings, "RECOMMENDATION_EMBEDDING_RANK", 128)
+
+    vectors = randomized_svd(index, rank, **options)
+    rows = [
+        MovieEmbedding(movie_id=int(movie_id), vector=vector.tobytes(), rank=vectors.shape[1])
+        for movie_id, vector in zip(index.row_to_movie_id, vectors)
+    ]
+    with transaction.atomic():
+        MovieEmbedding.objects.all().delete()
+        for start in range(0, len(rows), batch_size):
+            MovieEmbedding.objects.bulk_create(rows[start:start + batch_size])
+    return len(rows)
+
+
+class EmbeddingIndex:
+    """Dense, L2-normalized movie embeddings for matmul scoring.
+
+    ``basis`` maps TF-IDF terms into the embedding space (X^T U S / S^2), so
+    term-weighted taste profiles can be projected without storing it. Its
+    rows follow ``terms`` rather than the column order of any one TF-IDF
+    index, because a rebuild re-sorts the vocabulary.
+    """
+
+    def __init__(self, movie_ids, vectors, tfidf_index, signature=None):
+        self.signature = signature
+        self.terms = np.array(tfidf_index.terms, dtype=str)
+        self._term_to_row = None
+        self._columns = (None, None)
+        self.row_to_movie_id = np.array(movie_ids, dtype=np.int64)
+        self.movie_id_to_row = {int(movie_id): row for row, movie_id in enumerate(self.row_to_movie_id.tolist())}
+
+        singular_values = np.linalg.norm(vectors, axis=0)
+        singular_values[singular_values == 0] = 1
+        aligned = np.zeros((len(tfidf_index), vectors.shape[1]), dtype=np.float32)
+        for movie_id, vector in zip(movie_ids, vectors):
+            row = tfidf_index.movie_id_to_row.get(movie_id)
+            if row is not None:
+                aligned[row] = vector
+        self.basis = csc_dot(tfidf_index, aligned) / singular_values ** 2
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self.vectors = (vectors / norms).astype(np.float32)
+
+    @classmethod
+    def from_db(cls, tfidf_index=None):
+        signature = embedding_signature()
+        movie_ids = []
+        vectors = []
+        for movie_id, vector in MovieEmbedding.objects.order_by("pk").values_list("movie_id", "vector").iterator():
+            movie_ids.append(movie_id)
+            vectors.append(np.frombuffer(vector, dtype=np.float32))
+        if not vectors:
+            return None
+        return cls(movie_ids, np.vstack(vectors), tfidf_index or get_index(), signature=signature)
+
+    @classmethod
+    def from_arrays(cls, arrays, signature=None):
+        index = cls.__new__(cls)
+        index.signature = signature
+        index.row_to_movie_id = arrays["movie_ids"]
+        index.movie_id_to_row = {movie_id: row for row, movie_id in enumerate(index.row_to_movie_id.tolist())}
+        index.vectors = arrays["vectors"]
+        index.basis = arrays["basis"]
+        index.terms = arrays["terms"]
+        index._term_to_row = None
+        index._columns = (None, None)
+        return index
+
+    def to_arrays(self) -> dict:
+        return {"movie_ids": self.row_to_movie_id, "vectors": self.vectors, "basis": self.basis, "terms": self.terms}
+
+    def __len__(self):
+        return len(self.row_to_movie_id)
+
+    def basis_rows(self, tfidf_index) -> np.ndarray:
+        """Basis row of every column of ``tfidf_index``, -1 for terms the
+        basis has never seen. Cached per vocabulary list; upserts append to
+        it in place, so a longer list is mapped again."""
+        terms, rows = self._columns
+        if terms is not tfidf_index.terms or len(rows) != len(terms):
+            if self._term_to_row is None:
+                self._term_to_row = {term: row for row, term in enumerate(self.terms.tolist())}
+            rows = np.array([self._term_to_row.get(term, -1) for term in tfidf_index.terms], dtype=np.int64)
+            self._columns = (tfidf_index.terms, rows)
+        return rows
+
+    def project(self, indices, data, tfidf_index) -> np.ndarray:
+        """Project a query built by ``tfidf_index.terms_to_query``."""
+        rows = self.basis_rows(tfidf_index)[indices]
+        known = rows >= 0
+        return data[known] @ self.basis[rows[known]]
+
+    def recommend(self, vector, k, exclude_ids=()) -> list:
+        scores = np.asarray(self.vectors @ vector)
+        excluded = [self.movie_id_to_row[movie_id] for movie_id in exclude_ids if movie_id in self.movie_id_to_row]
+        scores[excluded] = -np.inf
+        best = top_k(scores, min(k, len(self) - len(excluded)))
+        return [(int(self.row_to_movie_id[i]), float(scores[i])) for i in best]
+
+    def similar(self, movie_id, k) -> list:
+        row = self.movie_id_to_row.get(movie_id)
+        if row is None:
+            return []
+        return self.recommend(self.vectors[row], k, exclude_ids=(movie_id,))
+
+
+def embedding_signature() -> tuple:
+    stats = MovieEmbedding.objects.aggregate(count=Count("movie_id"), last_created=Max("created_at"))
+    return (stats["count"], stats["last_created"])
+
+
+_embedding_index = None
+_embedding_index_signature = None
+_embedding_index_lock = threading.Lock()
+
+
+def load_stored_embedding_index(version) -> EmbeddingIndex | None:
+    manifest, arrays = load_index(version)
+    if not manifest["metadata"].get("embedding") or "embedding_terms" not in arrays:
+        return None
+    return EmbeddingIndex.from_arrays(split_arrays(arrays, "embedding_"), signature=("store", version))
+
+
+def get_embedding_index() -> EmbeddingIndex | None:
+    global _embedding_index, _embedding_index_signature
+    version = current_index_version()
+    signature = ("store", version) if version else embedding_signature()
+    if signature == _embedding_index_signature:
+        return _embedding_index
+    with _embedding_index_lock:
+        if signature != _embedding_index_signature:
+            if version:
+                _embedding_index = load_stored_embedding_index(version)
+            elif signature[0]:
+                _embedding_index = EmbeddingIndex.from_db()
+            else:
+                _embedding_index = None
+            _embedding_index_signature = signature
+        return _embedding_index
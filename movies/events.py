@@ -0,0 +1,163 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from movies.counters import add_to_counters
+from movies.models import View, WatchHistory
+from movies.popularity import bump_daily_stats
+from movies.recommendation import record_watch
+
+logger = logging.getLogger(__name__)
+
+WatchEvent = namedtuple("WatchEvent", ["user", "movie_id", "user_ip", "created_at"])
+
+VIEW_DEDUPE_WINDOW = timedelta(days=1)
+
+
+def write_watch_events(events) -> int:
+    """Persist a batch of watch events: drop repeats of a (user, movie) view
+    within VIEW_DEDUPE_WINDOW, bulk insert View and WatchHistory rows, and
+    apply one counter increment per movie and one bucket update per movie-day.
+    """
+    unique = {}
+    for event in events:
+        unique.setdefault((event.user.pk, event.movie_id), event)
+    if not unique:
+        return 0
+
+    cutoff = min(event.created_at for event in unique.values()) - VIEW_DEDUPE_WINDOW
+    recent = View.objects.filter(
+        created_at__gt=cutoff,
+        user_id__in={user_id for user_id, _ in unique},
+        movie_id__in={movie_id for _, movie_id in unique},
+    ).values_list("user_id", "movie_id", "created_at")
+    for user_id, movie_id, created_at in recent:
+        event = unique.get((user_id, movie_id))
+        if event is not None and created_at > event.created_at - VIEW_DEDUPE_WINDOW:
+            del unique[(user_id, movie_id)]
+    events = list(unique.values())
+    if not events:
+        return 0
+
+    with transaction.atomic():
+        View.objects.bulk_create([
+            View(user=event.user, movie_id=event.movie_id, user_ip=event.user_ip) for event in events
+        ])
+        watches = WatchHistory.objects.bulk_create([
+            WatchHistory(user=event.user, movie_id=event.movie_id) for event in events
+        ])
+        for movie_id, count in Counter(event.movie_id for event in events).items():
+            add_to_counters(movie_id, views=count)
+        days = Counter((event.movie_id, timezone.localdate(event.created_at)) for event in events)
+        for (movie_id, day), count in days.items():
+            bump_daily_stats(movie_id, views=count, day=day)
+
+    for event, watch in zip(events, watches):
+        try:
+            record_watch(event.user, event.movie_id, watch.created_at)
+        except Exception:
+            logger.exception("Could not update the taste profile of user %s.", event.user.pk)
+    return len(events)
+
+
+class EventBuffer:
+    """Write-behind queue for watch events.
+
+    Requests validate and ``add`` an event; a daemon thread flushes the queue
+    every ``flush_interval`` seconds or as soon as ``batch_size`` events are
+    waiting. When the queue is full the caller writes its event itself, so
+    events are never dropped. ``stop`` drains whatever is left.
+    """
+
+    def __init__(self, flush_interval=1.0, batch_size=500, max_queue=10000):
+        self.flush_interval = max(flush_interval, 0.01)
+        self.batch_size = batch_size
+        self.queue = queue.Queue(max_queue)
+        self.flushed = 0
+        self.failed = 0
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="watch-event-buffer", daemon=True)
+                self._thread.start()
+
+    def add(self, event):
+        self.start()
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            write_watch_events([event])
+
+    def _take_batch(self, deadline) -> list:
+        batch = []
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        try:
+            self.flushed += write_watch_events(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Could not write %s watch events.", len(batch))
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                batch = self._take_batch(time.monotonic() + self.flush_interval)
+                if batch:
+                    self._flush(batch)
+        finally:
+            connections.close_all()
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        while batch := self._take_batch(0):
+            self._flush(batch)
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "flushed": self.flushed, "failed": self.failed}
+
+
+_event_buffer = None
+_event_buffer_lock = threading.Lock()
+
+
+def get_event_buffer() -> EventBuffer:
+    global _event_buffer
+    if _event_buffer is None:
+        with _event_buffer_lock:
+            if _event_buffer is None:
+                options = getattr(settings, "WATCH_EVENT_BUFFER", {})
+                _event_buffer = EventBuffer(
+                    options.get("FLUSH_INTERVAL", 1.0),
+                    options.get("BATCH_SIZE", 500),
+                    options.get("MAX_QUEUE", 10000),
+                )
+                atexit.register(_event_buffer.stop)
+    return _event_buffer
+
+
+def ingest_watch_event(user, movie_id, user_ip):
+    event = WatchEvent(user, movie_id, user_ip, timezone.now())
+    if getattr(settings, "WATCH_EVENT_BUFFER", {}).get("ENABLED", False):
+        get_event_buffer().add(event)
+    else:
+        write_watch_events([event])
@@ -0,0 +1,158 @@
+import datetime
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+PINNED = "PINNED"
+
+
+def index_root() -> Path | None:
+    root = getattr(settings, "RECOMMENDATION_INDEX_DIR", None)
+    return Path(root) if root else None
+
+
+def current_index_version() -> str | None:
+    root = index_root()
+    if root is None:
+        return None
+    try:
+        return (root / CURRENT).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_path(version) -> Path:
+    return index_root() / "versions" / version
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and "datetime" in value:
+        return datetime.datetime.fromisoformat(value["datetime"])
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def new_version() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d%H%M%S%f") + "-" + uuid.uuid4().hex[:8]
+
+
+def write_index(arrays, metadata, activate=True, version=None) -> str:
+    """Write ``arrays`` (name -> ndarray) as one .npy file each plus a
+    manifest into a new version directory, then optionally point CURRENT at
+    it. Both steps are atomic renames, so readers never see a partial index.
+    """
+    root = index_root()
+    version = version or new_version()
+    staging = root / "staging" / version
+    staging.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(staging / f"{name}.npy", np.ascontiguousarray(array), allow_pickle=False)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "arrays": sorted(arrays),
+        "metadata": _encode(metadata),
+    }
+    (staging / MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+    target = version_path(version)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(staging, target)
+    if activate:
+        activate_version(version)
+    return version
+
+
+def activate_version(version, pin=False):
+    """Point CURRENT at ``version``. A pinned version (set by a rollback) is
+    kept until the next activation, so automatic rebuilds leave it alone."""
+    root = index_root()
+    if not (version_path(version) / MANIFEST).exists():
+        raise FileNotFoundError(f"Recommendation index version {version} does not exist.")
+    pointer = root / f"{CURRENT}.{uuid.uuid4().hex}"
+    pointer.write_text(version)
+    os.replace(pointer, root / CURRENT)
+    if pin:
+        (root / PINNED).write_text(version)
+    else:
+        (root / PINNED).unlink(missing_ok=True)
+
+
+def is_pinned() -> bool:
+    root = index_root()
+    return root is not None and (root / PINNED).exists()
+
+
+def read_manifest(version) -> dict:
+    manifest = json.loads((version_path(version) / MANIFEST).read_text())
+    if manifest["format"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recommendation index format {manifest['format']}.")
+    manifest["metadata"] = _decode(manifest["metadata"])
+    return manifest
+
+
+def load_index(version) -> tuple:
+    """Return (manifest, arrays) with every array opened as a read-only
+    memory map, so all workers share one page-cached copy."""
+    manifest = read_manifest(version)
+    path = version_path(version)
+    arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in manifest["arrays"]}
+    return manifest, arrays
+
+
+def store_index(tfidf_index, embedding_index=None, activate=True) -> str:
+    arrays = dict(tfidf_index.to_arrays())
+    metadata = {"tfidf": tfidf_index.metadata(), "embedding": None}
+    if embedding_index is not None:
+        arrays.update({f"embedding_{name}": array for name, array in embedding_index.to_arrays().items()})
+        metadata["embedding"] = {"rank": int(embedding_index.vectors.shape[1])}
+    return write_index(arrays, metadata, activate, getattr(tfidf_index, "version", None))
+
+
+def split_arrays(arrays, prefix) -> dict:
+    return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+
+def previous_version(version) -> str | None:
+    older = [candidate for candidate in list_versions() if candidate < version]
+    return older[-1] if older else None
+
+
+def list_versions() -> list:
+    root = index_root()
+    if root is None or not (root / "versions").exists():
+        return []
+    return sorted(path.name for path in (root / "versions").iterdir() if (path / MANIFEST).exists())
+
+
+def prune_versions(keep=None) -> list:
+    if keep is None:
+        keep = getattr(settings, "RECOMMENDATION_INDEX_KEEP_VERSIONS", 3)
+    current = current_index_version()
+    removable = [version for version in list_versions() if version != current]
+    removed = removable[:max(len(removable) - max(keep - 1, 0), 0)]
+    for version in removed:
+        shutil.rmtree(version_path(version))
+    return removed
@@ -0,0 +1,26 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from movies.ann import build_ann_backend, recall_at_k
+from movies.recommendation import get_index
+
+
+class Command(BaseCommand):
+    help = "Report recall@k and latency of the approximate similar-movie backend against exact scoring."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--sample", type=int, default=200)
+        parser.add_argument("--backend", default=None)
+        parser.add_argument("--tables", type=int, dest="n_tables")
+        parser.add_argument("--bits", type=int, dest="n_bits")
+        parser.add_argument("--probes", type=int)
+
+    def handle(self, *args, **options):
+        index = get_index()
+        overrides = {name: options[name] for name in ("n_tables", "n_bits", "probes") if options[name] is not None}
+        started = time.perf_counter()
+        backend = build_ann_backend(index, options["backend"], **overrides)
+        report = recall_at_k(index, backend, k=options["k"], sample=options["sample"])
+        report["build_seconds"] = time.perf_counter() - started
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from asgiref.sync import ThreadSensitiveContext
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+from movies import views
+from movies.benchmark import BENCHMARK_SETTINGS, generate_catalog
+from movies.models import Movie, WatchHistory
+
+ENDPOINTS = {
+    "like": (views.LikeMovie, views.AsyncLikeMovie),
+    "history": (views.UpdateHistory, views.AsyncUpdateHistory),
+    "my-list": (views.ToggleMyListView, views.AsyncToggleMyListView),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sustained requests/s of the sync interaction views on a pool of WSGI worker "
+        "threads with the async views on one event loop, under the same client concurrency "
+        "and an optional simulated database round trip. Runs against a synthetic catalog in a "
+        "throwaway test database. SQLite serializes writers, so the like and my-list endpoints "
+        "fail with locked-database errors there; compare them on PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="my-list")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=4, help="WSGI worker threads, as in gunicorn --threads.")
+        parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight at once.")
+        parser.add_argument("--movies", type=int, default=200)
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--db-latency-ms", type=float, default=2.0, help="Added to every query to mimic a networked database.")
+
+    def handle(self, *args, **options):
+        if options["movies"] < 1 or options["users"] < 1:
+            raise CommandError("--movies and --users must be at least 1.")
+        if options["requests"] > options["movies"] * options["users"]:
+            raise CommandError(f"At most {options['movies'] * options['users']} requests; raise --users or --movies.")
+
+        # The views write likes, history, views, counters and taste profiles,
+        # so never point them at the real database.
+        with override_settings(**BENCHMARK_SETTINGS), tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == "sqlite":
+                # SQLite's default in-memory test database shares one cache
+                # between connections, which fails concurrent writers at once
+                # instead of letting them wait for the lock.
+                connection.settings_dict["TEST"]["NAME"] = f"{directory}/bench_interactions.sqlite3"
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                generate_catalog(
+                    movies=options["movies"], genres=5, languages=2, users=options["users"], watches=0, likes=0, views=0
+                )
+                results = self.run_endpoint(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for name, (seconds, latencies, errors) in results.items():
+            failed = ", ".join(f"{count}x {status}" for status, count in sorted(errors.items())) or "none"
+            self.stdout.write(
+                f"{name}: {len(latencies) / seconds:.0f} req/s, p50 {statistics.median(latencies) * 1000:.1f}ms, "
+                f"p95 {statistics.quantiles(latencies, n=20)[-1] * 1000:.1f}ms, non-2xx responses: {failed}"
+            )
+        ratio = (len(results["asgi"][1]) / results["asgi"][0]) / (len(results["wsgi"][1]) / results["wsgi"][0])
+        self.stdout.write(self.style.SUCCESS(f"ASGI/WSGI throughput: {ratio:.2f}x on {connection.vendor} with "
+            f"{options['workers']} WSGI worker threads, {options['concurrency']} requests in flight and "
+            f"{options['db_latency_ms']}ms added per query."))
+        if any(errors for _, _, errors in results.values()):
+            raise CommandError("Some requests failed, so the throughput above is not comparable.")
+
+    def run_endpoint(self, options) -> dict:
+        movie_ids = list(Movie.objects.order_by("id").values_list("id", flat=True))
+        users = list(User.objects.order_by("id"))
+        if options["endpoint"] == "like":
+            WatchHistory.objects.bulk_create(
+                [WatchHistory(user=user, movie_id=movie_id) for user in users for movie_id in movie_ids], batch_size=1000
+            )
+        # Distinct (user, movie) pairs, so concurrent requests never race on
+        # the same row and every request does the same amount of work.
+        pairs = [(user_index, movie_id) for user_index in range(len(users)) for movie_id in movie_ids]
+        pairs = random.Random(0).sample(pairs, options["requests"])
+        payloads = [(user_index, json.dumps({"id": movie_id})) for user_index, movie_id in pairs]
+        sync_view, async_view = ENDPOINTS[options["endpoint"]]
+
+        latency = options["db_latency_ms"] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        if latency:
+            connection_created.connect(add_latency)
+            connections.close_all()
+        try:
+            return {
+                "wsgi": self.run_sync(sync_view, users, payloads, options["workers"]),
+                "asgi": asyncio.run(self.run_async(async_view, users, payloads, options["concurrency"])),
+            }
+        finally:
+            connection_created.disconnect(add_latency)
+            connections.close_all()
+
+    def urlconf(self, view):
+        class BenchUrls:
+            urlpatterns = [path("interaction/", view.as_view())]
+        return BenchUrls
+
+    def run_sync(self, view, users, payloads, workers) -> tuple:
+        clients = []
+        for user in users:
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            clients.append(client)
+
+        def send(payload):
+            user_index, body = payload
+            started = time.perf_counter()
+            response = clients[user_index].post("/interaction/", body, content_type="application/json")
+            try:
+                return time.perf_counter() - started, response.status_code
+            finally:
+                connections.close_all()
+
+        with override_settings(ROOT_URLCONF=self.urlconf(view)):
+            started = time.perf_counter()
+            # Clients beyond the worker count queue up, as they would behind
+            # a WSGI server's fixed thread pool.
+            with ThreadPoolExecutor(workers) as executor:
+                outcomes = list(executor.map(send, payloads))
+            seconds = time.perf_counter() - started
+        return self.summarize(seconds, outcomes)
+
+    async def run_async(self, view, users, payloads, concurrency) -> tuple:
+        clients = []
+        for user in users:
+            client = AsyncClient(raise_request_exception=False)
+            await client.aforce_login(user)
+            clients.append(client)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(payload):
+            user_index, body = payload
+            # ASGIHandler gives every request its own thread for sync work;
+            # AsyncClient does not, so do it here.
+            async with semaphore, ThreadSensitiveContext():
+                started = time.perf_counter()
+                response = await clients[user_index].post("/interaction/", body, content_type="application/json")
+                return time.perf_counter() - started, response.status_code
+
+        with override_settings(ROOT_URLCONF=self.urlconf(view)):
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(send(payload) for payload in payloads))
+            seconds = time.perf_counter() - started
+        return self.summarize(seconds, outcomes)
+
+    def summarize(self, seconds, outcomes) -> tuple:
+        """(seconds, latencies, Counter of non-2xx statuses). Rejected
+        requests are fast, so any of them make the rate meaningless."""
+        errors = Counter(status for _, status in outcomes if not 200 <= status < 300)
+        return seconds, [elapsed for elapsed, _ in outcomes], errors
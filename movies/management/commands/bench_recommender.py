@@ -0,0 +1,150 @@
+import json
+import platform
+import random
+import time
+import django
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from core.views import home
+from movies import views
+from movies.benchmark import BENCHMARK_SETTINGS, WORDS, generate_catalog, measure
+from movies.cache import bump_catalog_version, get_recommendation_cache
+from movies.models import Movie
+from movies.recommendation import (
+    TfidfIndex,
+    get_for_you_recommendation,
+    get_index,
+    get_similar_recommendation,
+    invalidate_index,
+    rebuild_taste_profile,
+)
+from movies.search import invalidate_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic catalog in a throwaway test database at each scale and "
+        "report p50/p95 latency, query count and peak memory of the recommender and the hot views "
+        "as JSON. Run with DB_ENGINE=sqlite to benchmark against SQLite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", default="1,4,16", help="Comma separated multipliers of the base counts below.")
+        parser.add_argument("--movies", type=int, default=500)
+        parser.add_argument("--genres", type=int, default=20, help="Not scaled.")
+        parser.add_argument("--languages", type=int, default=8, help="Not scaled.")
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--watches", type=int, default=5000)
+        parser.add_argument("--likes", type=int, default=1500)
+        parser.add_argument("--views", type=int, default=8000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--sample-users", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options["scales"].split(",")]
+        except ValueError:
+            raise CommandError("--scales must be a comma separated list of integers.")
+        if options["repeat"] < 2:
+            raise CommandError("--repeat must be at least 2.")
+
+        report = {
+            "started_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "seed": options["seed"],
+            "repeat": options["repeat"],
+            "scales": [],
+        }
+        with override_settings(**BENCHMARK_SETTINGS):
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                for scale in scales:
+                    self.stderr.write(f"Benchmarking scale {scale}...")
+                    report["scales"].append(self.run_scale(scale, options))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        self.stdout.write(output)
+
+    def run_scale(self, scale, options) -> dict:
+        counts = {
+            "movies": options["movies"] * scale,
+            "genres": options["genres"],
+            "languages": options["languages"],
+            "users": options["users"] * scale,
+            "watches": options["watches"] * scale,
+            "likes": options["likes"] * scale,
+            "views": options["views"] * scale,
+        }
+        call_command("flush", interactive=False, verbosity=0)
+        self.reset_state()
+        try:
+            started = time.perf_counter()
+            counts = generate_catalog(**counts, seed=options["seed"])
+            result = {"scale": scale, "counts": counts, "generate_seconds": time.perf_counter() - started}
+            result["targets"] = self.run_targets(options)
+            return result
+        finally:
+            self.reset_state()
+
+    def reset_state(self):
+        invalidate_index()
+        invalidate_search_index()
+        get_recommendation_cache().clear()
+        bump_catalog_version()
+
+    def run_targets(self, options) -> dict:
+        rng = random.Random(options["seed"])
+        repeat = options["repeat"]
+        factory = RequestFactory()
+        anonymous = AnonymousUser()
+        targets = {}
+
+        targets["build_index"] = measure(lambda _: TfidfIndex.from_movies(), repeat=max(2, repeat // 10), warmup=0)
+        index = get_index()
+
+        titles = rng.sample(list(Movie.objects.values_list("title", flat=True)), min(repeat + 2, len(index)))
+        users = list(User.objects.filter(watch_history__isnull=False).distinct().order_by("id")[:options["sample_users"]])
+        if not titles or not users:
+            raise CommandError("The synthetic catalog has no movies or no watch history; raise the counts.")
+        for user in users:
+            rebuild_taste_profile(user, index)
+        queries = [" ".join(rng.sample(WORDS, rng.randint(1, 2))) for _ in range(repeat + 2)]
+
+        def view(view_class, path, user, **params):
+            request = factory.get(path, params)
+            request.user = user
+            return view_class.as_view()(request).render()
+
+        def render_home(iteration):
+            request = factory.get("/")
+            request.user = users[iteration % len(users)]
+            return home(request)
+
+        targets["get_similar_recommendation"] = measure(
+            lambda iteration: get_similar_recommendation(titles[iteration % len(titles)]), repeat
+        )
+        targets["get_for_you_recommendation"] = measure(
+            lambda iteration: get_for_you_recommendation(users[iteration % len(users)]), repeat
+        )
+        # Every sampled user's "for you" row is cached during warm-up, so
+        # this times the steady state of the home page.
+        targets["home"] = measure(render_home, repeat, warmup=len(users))
+        targets["popular_movies"] = measure(lambda _: view(views.PopularMoviesView, "/movies/popular/", anonymous), repeat)
+        targets["movie_search"] = measure(
+            lambda iteration: view(views.MovieListView, "/movies/", anonymous, search=queries[iteration % len(queries)]),
+            repeat,
+        )
+        return targets
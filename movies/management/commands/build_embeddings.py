@@ -0,0 +1,27 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from movies.embeddings import build_movie_embeddings
+from movies.recommendation import TfidfIndex
+
+
+class Command(BaseCommand):
+    help = "Project the TF-IDF matrix to dense movie embeddings with a randomized truncated SVD."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rank", type=int, default=getattr(settings, "RECOMMENDATION_EMBEDDING_RANK", 128))
+        parser.add_argument("--oversamples", type=int, default=10)
+        parser.add_argument("--iterations", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = build_movie_embeddings(
+            TfidfIndex.from_movies(),
+            rank=options["rank"],
+            batch_size=options["batch_size"],
+            n_oversamples=options["oversamples"],
+            n_iter=options["iterations"],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Stored {created} embeddings of rank {options['rank']} in {elapsed:.2f}s."))
@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from movies.embeddings import EmbeddingIndex
+from movies.index_store import index_root, prune_versions, store_index
+from movies.recommendation import TfidfIndex
+
+
+class Command(BaseCommand):
+    help = "Write the recommendation index to RECOMMENDATION_INDEX_DIR as a new memory-mappable version."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--skip-embeddings", action="store_true")
+        parser.add_argument("--no-activate", action="store_true")
+        parser.add_argument("--keep", type=int, help="Number of versions to keep on disk (default RECOMMENDATION_INDEX_KEEP_VERSIONS).")
+
+    def handle(self, *args, **options):
+        if index_root() is None:
+            raise CommandError("RECOMMENDATION_INDEX_DIR is not set.")
+        started = time.perf_counter()
+        tfidf_index = TfidfIndex.from_movies()
+        embedding_index = None if options["skip_embeddings"] else EmbeddingIndex.from_db(tfidf_index)
+        version = store_index(tfidf_index, embedding_index, activate=not options["no_activate"])
+        removed = prune_versions(options["keep"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote recommendation index {version} ({len(tfidf_index)} movies) in {elapsed:.2f}s; "
+            f"pruned {len(removed)} old versions."
+        ))
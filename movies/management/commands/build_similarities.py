@@ -0,0 +1,33 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from movies.recommendation import TfidfIndex
+from movies.similarity_builder import build_similarity_table
+
+
+class Command(BaseCommand):
+    help = "Precompute the top-K similar movies for every movie from its tags."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=getattr(settings, "SIMILAR_MOVIES_TOP_K", 20))
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--memory-budget-mb", type=int, default=256, help="Memory per worker for one row block.")
+
+    def handle(self, *args, **options):
+        def progress(done, total, rate):
+            self.stdout.write(f"{done}/{total} movies ({rate:.0f} movies/s)")
+
+        stats = build_similarity_table(
+            TfidfIndex.from_movies(),
+            top_k=options["top_k"],
+            workers=options["workers"],
+            memory_budget=options["memory_budget_mb"] * 1024 ** 2,
+            batch_size=options["batch_size"],
+            progress=progress if options["verbosity"] > 0 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stats['rows']} similarities for {stats['movies']} movies in {stats['seconds']:.2f}s "
+            f"({stats['movies_per_second']:.0f} movies/s, {stats['blocks']} blocks of {stats['block_size']} "
+            f"on {stats['workers']} workers)."
+        ))
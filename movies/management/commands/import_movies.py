@@ -0,0 +1,174 @@
+import csv
+import time
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from movies.cache import bump_catalog_version, get_recommendation_cache
+from movies.models import Genre, Language, Movie
+from movies.tokenizer import generate_tags
+
+REQUIRED_COLUMNS = ("title", "description", "youtube_id", "poster", "duration", "language", "genres")
+UPDATE_FIELDS = ["title", "description", "poster", "duration", "language", "tags", "updated_at"]
+# Checked up front: bulk_create would otherwise fail the whole chunk on
+# PostgreSQL, and SQLite would store the overlong value silently.
+LENGTH_CHECKED_FIELDS = ("title", "youtube_id", "poster")
+
+
+class NameCache:
+    """In-memory get-or-create for name-keyed lookup tables (Genre, Language):
+    known names never hit the database, new ones are created in one bulk
+    insert per chunk."""
+
+    def __init__(self, model):
+        self.model = model
+        self.max_length = model._meta.get_field("name").max_length
+        self.ids = dict(model.objects.values_list("name", "id"))
+        self.created = 0
+
+    def resolve(self, names) -> dict:
+        missing = {name for name in names if name not in self.ids}
+        if missing:
+            self.model.objects.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            found = dict(self.model.objects.filter(name__in=missing).values_list("name", "id"))
+            self.created += len(found)
+            self.ids.update(found)
+        return self.ids
+
+
+def parse_row(row, genre_separator, genre_max_length, language_max_length) -> dict:
+    missing = [column for column in REQUIRED_COLUMNS if not (row.get(column) or "").strip()]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    genres = list(dict.fromkeys(name.strip() for name in row["genres"].split(genre_separator) if name.strip()))
+    language = row["language"].strip()
+    too_long = [name for name in genres if len(name) > genre_max_length]
+    if len(language) > language_max_length:
+        too_long.append(language)
+    if too_long:
+        raise ValueError(f"name too long: {', '.join(too_long)}")
+    too_long_fields = [
+        field for field in LENGTH_CHECKED_FIELDS
+        if len(row[field].strip()) > Movie._meta.get_field(field).max_length
+    ]
+    if too_long_fields:
+        raise ValueError(f"too long: {', '.join(too_long_fields)}")
+    duration = int(row["duration"])
+    if not 0 <= duration <= 32767:
+        raise ValueError(f"duration out of range: {duration}")
+    return {
+        "title": row["title"].strip(),
+        "description": row["description"].strip(),
+        "youtube_id": row["youtube_id"].strip(),
+        "poster": row["poster"].strip(),
+        "duration": duration,
+        "language": language,
+        "genres": genres,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Import movies from a CSV with the columns title, description, youtube_id, poster, duration, "
+        "language and genres. Rows are keyed on youtube_id, so an interrupted import can simply be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--genre-separator", default="|")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--encoding", default="utf-8")
+        parser.add_argument("--update", action="store_true", help="Overwrite movies whose youtube_id already exists.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.genres = NameCache(Genre)
+        self.languages = NameCache(Language)
+        self.update = options["update"]
+        self.counts = {"created": 0, "updated": 0, "skipped": 0, "invalid": 0}
+
+        try:
+            handle = open(options["csv_path"], newline="", encoding=options["encoding"])
+        except OSError as error:
+            raise CommandError(f"Cannot open {options['csv_path']}: {error}")
+        with handle:
+            reader = csv.DictReader(handle, delimiter=options["delimiter"])
+            missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+            if missing:
+                raise CommandError(f"CSV is missing the columns: {', '.join(missing)}")
+
+            rows = enumerate(reader, start=2)
+            while chunk := list(islice(rows, options["chunk_size"])):
+                self.import_chunk(chunk, options["genre_separator"])
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"Imported through line {chunk[-1][0]}: {self.counts}")
+
+        if self.counts["created"] or self.counts["updated"]:
+            get_recommendation_cache().bump_catalog()
+            bump_catalog_version()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {self.counts['created']}, updated {self.counts['updated']}, skipped {self.counts['skipped']} "
+            f"existing and {self.counts['invalid']} invalid movies in {elapsed:.2f}s "
+            f"({self.genres.created} new genres, {self.languages.created} new languages)."
+        ))
+
+    def import_chunk(self, chunk, genre_separator):
+        records = {}
+        for line, row in chunk:
+            try:
+                record = parse_row(row, genre_separator, self.genres.max_length, self.languages.max_length)
+            except ValueError as error:
+                self.counts["invalid"] += 1
+                self.stderr.write(f"Line {line}: {error}")
+                continue
+            # Within a chunk the last row for a youtube_id wins.
+            records[record["youtube_id"]] = record
+        if not records:
+            return
+
+        with transaction.atomic():
+            existing = dict(Movie.objects.filter(youtube_id__in=records).values_list("youtube_id", "id"))
+            if not self.update:
+                self.counts["skipped"] += len(existing)
+                records = {youtube_id: record for youtube_id, record in records.items() if youtube_id not in existing}
+                existing = {}
+            if not records:
+                return
+
+            genre_ids = self.genres.resolve({name for record in records.values() for name in record["genres"]})
+            language_ids = self.languages.resolve({record["language"] for record in records.values()})
+            now = timezone.now()
+            movies = []
+            for youtube_id, record in records.items():
+                movies.append(Movie(
+                    id=existing.get(youtube_id),
+                    title=record["title"],
+                    description=record["description"],
+                    youtube_id=youtube_id,
+                    poster=record["poster"],
+                    duration=record["duration"],
+                    language_id=language_ids[record["language"]],
+                    tags=generate_tags(record["description"], record["genres"], record["language"]),
+                    created_at=now,
+                    updated_at=now,
+                ))
+
+            new_movies = [movie for movie in movies if movie.id is None]
+            Movie.objects.bulk_create(new_movies)
+            if existing:
+                Movie.objects.bulk_update([movie for movie in movies if movie.id is not None], UPDATE_FIELDS)
+            # Not every backend returns primary keys from bulk_create.
+            movie_ids = dict(Movie.objects.filter(youtube_id__in=records).values_list("youtube_id", "id"))
+
+            through = Movie.genres.through
+            through.objects.filter(movie_id__in=existing.values()).delete()
+            through.objects.bulk_create([
+                through(movie_id=movie_ids[youtube_id], genre_id=genre_ids[name])
+                for youtube_id, record in records.items()
+                for name in record["genres"]
+            ], ignore_conflicts=True)
+
+        self.counts["created"] += len(new_movies)
+        self.counts["updated"] += len(existing)
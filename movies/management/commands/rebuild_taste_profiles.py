@@ -0,0 +1,20 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from movies.cache import get_recommendation_cache
+from movies.recommendation import get_index, rebuild_taste_profile
+
+
+class Command(BaseCommand):
+    help = "Rebuild every user's taste profile from their watch history and likes."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = get_index()
+        count = 0
+        for user in User.objects.filter(watch_history__isnull=False).distinct().iterator():
+            rebuild_taste_profile(user, index)
+            count += 1
+        get_recommendation_cache().bump_catalog()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} taste profiles in {elapsed:.2f}s."))
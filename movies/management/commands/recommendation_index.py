@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from movies.recommendation import IndexBuildError, get_index, index_status, rebuild_index, rollback_index
+
+
+class Command(BaseCommand):
+    help = "Show, rebuild or roll back the recommendation index version."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["status", "rebuild", "rollback"])
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        if action == "rebuild":
+            try:
+                index = rebuild_index()
+            except IndexBuildError as error:
+                raise CommandError(str(error))
+            self.stdout.write(self.style.SUCCESS(f"Built recommendation index {index.version} in {index.build_seconds:.2f}s."))
+        elif action == "rollback":
+            get_index()
+            index = rollback_index()
+            if index is None:
+                raise CommandError("There is no previous recommendation index version to roll back to.")
+            self.stdout.write(self.style.SUCCESS(f"Rolled back to recommendation index {index.version}."))
+        else:
+            get_index()
+        self.stdout.write(json.dumps(index_status(), indent=2, cls=DjangoJSONEncoder))
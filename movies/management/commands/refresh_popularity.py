@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from movies.popularity import backfill_daily_stats, prune_daily_stats, refresh_popularity
+
+
+class Command(BaseCommand):
+    help = "Rebuild the popular movies ranking from the daily like/view buckets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backfill", action="store_true", help="Recompute every daily bucket from the likes and views tables first.")
+        parser.add_argument("--keep-days", type=int, help="Delete daily buckets older than this many days.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["backfill"]:
+            buckets = backfill_daily_stats()
+            self.stdout.write(f"Backfilled {buckets} daily buckets.")
+        if options["keep_days"] is not None:
+            pruned = prune_daily_stats(options["keep_days"])
+            self.stdout.write(f"Pruned {pruned} daily buckets.")
+        ranked = refresh_popularity()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Ranked {ranked} popular movies in {elapsed:.2f}s."))
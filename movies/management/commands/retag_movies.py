@@ -0,0 +1,88 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from movies.cache import bump_catalog_version, get_recommendation_cache
+from movies.models import Genre, Movie
+from movies.tokenizer import generate_tags
+
+
+def retag_chunk(chunk) -> list:
+    return [(movie_id, generate_tags(description, genre_names, language)) for movie_id, description, genre_names, language in chunk]
+
+
+def movie_chunks(chunk_size):
+    movies = (
+        Movie.objects.select_related("language")
+        .prefetch_related(Prefetch("genres", queryset=Genre.objects.only("name")))
+        .only("id", "description", "tags", "language__name")
+        .order_by("id")
+    )
+    chunk = []
+    current_tags = {}
+    for movie in movies.iterator(chunk_size=chunk_size):
+        chunk.append((movie.id, movie.description, [genre.name for genre in movie.genres.all()], movie.language.name))
+        current_tags[movie.id] = movie.tags
+        if len(chunk) >= chunk_size:
+            yield chunk, current_tags
+            chunk, current_tags = [], {}
+    if chunk:
+        yield chunk, current_tags
+
+
+class Command(BaseCommand):
+    help = "Regenerate every movie's tags from its description, genres and language."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        chunk_size = options["chunk_size"]
+        workers = options["workers"]
+        scanned = 0
+        updated = 0
+
+        def store(results, current_tags):
+            # Bumping updated_at lets running processes pick the new tags up
+            # through catch_up(); bulk_update skips auto_now and signals.
+            now = timezone.now()
+            changed = [
+                Movie(id=movie_id, tags=tags, updated_at=now)
+                for movie_id, tags in results
+                if tags != current_tags[movie_id]
+            ]
+            Movie.objects.bulk_update(changed, ["tags", "updated_at"], batch_size=chunk_size)
+            return len(changed)
+
+        with transaction.atomic():
+            if workers == 1:
+                for chunk, current_tags in movie_chunks(chunk_size):
+                    updated += store(retag_chunk(chunk), current_tags)
+                    scanned += len(chunk)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    pending = []
+                    for chunk, current_tags in movie_chunks(chunk_size):
+                        pending.append((executor.submit(retag_chunk, chunk), current_tags, len(chunk)))
+                        if len(pending) >= workers * 2:
+                            future, current_tags, size = pending.pop(0)
+                            updated += store(future.result(), current_tags)
+                            scanned += size
+                    for future, current_tags, size in pending:
+                        updated += store(future.result(), current_tags)
+                        scanned += size
+
+        if updated:
+            get_recommendation_cache().bump_catalog()
+            bump_catalog_version()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Retagged {updated} of {scanned} movies in {elapsed:.2f}s ({scanned / elapsed if elapsed else 0:.0f} movies/s)."
+        ))
+        if updated:
+            self.stdout.write("Run build_similarities to refresh the stored similar movies.")
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from movies.counters import rollup_counters
+
+
+class Command(BaseCommand):
+    help = "Fold the sharded view/like counters into Movie.total_views and total_likes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        shards = rollup_counters(options["batch_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {shards} counter shards in {elapsed:.2f}s."))
@@ -97,11 +97,6 @@ class View(models.Model):
             models.Index(fields=["movie", "created_at"]),
         ]
 
-    def save(self,*args, **kwargs):
-        print(self.movie)
-        Movie.objects.filter(pk=self.movie.id).update(total_views=models.F('total_views') + 1)
-        return super().save(*args, **kwargs)
-
     def __str__(self):
         return f"{self.user} watched {self.movie} from {self.user_ip}"
 
@@ -117,10 +112,6 @@ class Like(models.Model):
         indexes = [
             models.Index(fields=["movie", "created_at"])
         ]
-    def save(self,*args, **kwargs):
-        Movie.objects.filter(pk=self.movie.id).update(total_likes=models.F('total_likes') + 1)
-        return super().save(*args, **kwargs)
-    
     def __str__(self):
         return f"{self.user} liked {self.movie} at {self.created_at}"
 
@@ -135,3 +126,104 @@ class MyList(models.Model):
 
     def __str__(self):
         return f"{self.user} added {self.movie} at {self.created_at}"
+
+class MovieSimilarity(models.Model):
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="similarities")
+    neighbor = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = "movie_similarities"
+        verbose_name_plural = "movie_similarities"
+        unique_together = ("movie", "rank")
+
+    def __str__(self):
+        return f"{self.neighbor} is #{self.rank} similar to {self.movie}"
+
+class UserTasteProfile(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="taste_profile")
+    weights = models.JSONField(default=dict)
+    watched_movies = models.JSONField(default=list)
+    log2_scale = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "user_taste_profiles"
+        verbose_name_plural = "user_taste_profiles"
+
+    def __str__(self):
+        return f"{self.user} taste profile"
+
+class MovieEmbedding(models.Model):
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name="embedding")
+    vector = models.BinaryField()
+    rank = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "movie_embeddings"
+        verbose_name_plural = "movie_embeddings"
+
+    def __str__(self):
+        return f"{self.movie} embedding ({self.rank})"
+
+class MovieDailyStats(models.Model):
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    likes = models.IntegerField(default=0)
+    views = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "movie_daily_stats"
+        verbose_name_plural = "movie_daily_stats"
+        unique_together = ("movie", "day")
+        indexes = [
+            models.Index(fields=["day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.movie} on {self.day}: {self.likes} likes, {self.views} views"
+
+class PopularMovie(models.Model):
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name="popular_rank")
+    rank = models.PositiveIntegerField(db_index=True)
+    popularity = models.FloatField()
+    recent_likes = models.PositiveIntegerField()
+    recent_views = models.PositiveIntegerField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "popular_movies"
+        verbose_name_plural = "popular_movies"
+
+    def __str__(self):
+        return f"{self.movie} is #{self.rank} popular"
+
+class MovieCounterShard(models.Model):
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="counter_shards")
+    shard = models.PositiveSmallIntegerField()
+    views = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "movie_counter_shards"
+        verbose_name_plural = "movie_counter_shards"
+        unique_together = ("movie", "shard")
+
+    def __str__(self):
+        return f"{self.movie} shard {self.shard}: {self.views} views, {self.likes} likes"
+
+class ContentVersion(models.Model):
+    """A counter bumped whenever one kind of rendered content changes, kept
+    in the database so every worker and management command agrees on it."""
+    name = models.CharField(max_length=20, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    bumped_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "content_versions"
+        verbose_name_plural = "content_versions"
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,140 @@
+import datetime
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from movies.cache import bump_popularity_version
+from movies.models import Like, MovieDailyStats, PopularMovie, View
+
+logger = logging.getLogger(__name__)
+
+
+def _day(when=None) -> datetime.date:
+    return timezone.localdate(when) if when is not None else timezone.localdate()
+
+
+def bump_daily_stats(movie_id, likes=0, views=0, day=None):
+    """Add ``likes``/``views`` (which may be negative) to the movie's bucket
+    for ``day``, creating the bucket on first use."""
+    day = day or _day()
+    buckets = MovieDailyStats.objects.filter(movie_id=movie_id, day=day)
+    if buckets.update(likes=F("likes") + likes, views=F("views") + views):
+        return
+    try:
+        with transaction.atomic():
+            MovieDailyStats.objects.create(movie_id=movie_id, day=day, likes=likes, views=views)
+    except IntegrityError:
+        buckets.update(likes=F("likes") + likes, views=F("views") + views)
+
+
+def backfill_daily_stats(since=None) -> int:
+    """Rebuild the daily buckets from the raw likes and views tables."""
+    buckets = {}
+    for model, field in ((Like, "likes"), (View, "views")):
+        events = model.objects.all()
+        if since is not None:
+            events = events.filter(created_at__date__gte=since)
+        rows = events.annotate(day=TruncDate("created_at")).values("movie_id", "day").annotate(count=Count("id"))
+        for row in rows.order_by():
+            bucket = buckets.setdefault((row["movie_id"], row["day"]), {"likes": 0, "views": 0})
+            bucket[field] = row["count"]
+
+    with transaction.atomic():
+        stale = MovieDailyStats.objects.all()
+        if since is not None:
+            stale = stale.filter(day__gte=since)
+        stale.delete()
+        MovieDailyStats.objects.bulk_create(
+            [MovieDailyStats(movie_id=movie_id, day=day, **counts) for (movie_id, day), counts in buckets.items()],
+            batch_size=1000,
+        )
+    return len(buckets)
+
+
+def prune_daily_stats(keep_days) -> int:
+    deleted, _ = MovieDailyStats.objects.filter(day__lt=_day() - datetime.timedelta(days=keep_days)).delete()
+    return deleted
+
+
+def refresh_popularity(window_days=None, limit=None) -> int:
+    """Rank movies by likes / (views + 1) over the last ``window_days`` daily
+    buckets (today included) and replace the PopularMovie table. The
+    popularity version is bumped only when the order changed."""
+    window_days = window_days or getattr(settings, "POPULARITY_WINDOW_DAYS", 7)
+    limit = limit or getattr(settings, "POPULARITY_TABLE_SIZE", 1000)
+    now = timezone.now()
+    since = _day(now) - datetime.timedelta(days=window_days - 1)
+    totals = (
+        MovieDailyStats.objects.filter(day__gte=since)
+        .values("movie_id")
+        .annotate(recent_likes=Sum("likes"), recent_views=Sum("views"))
+        .filter(recent_likes__gt=0)
+    )
+    ranked = sorted(
+        (
+            (row["recent_likes"] / (row["recent_views"] + 1.0), row["recent_likes"], row["recent_views"], row["movie_id"])
+            for row in totals
+        ),
+        reverse=True,
+    )[:limit]
+
+    with transaction.atomic():
+        previous = list(PopularMovie.objects.order_by("rank").values_list("movie_id", flat=True))
+        PopularMovie.objects.all().delete()
+        PopularMovie.objects.bulk_create([
+            PopularMovie(
+                movie_id=movie_id,
+                rank=rank,
+                popularity=popularity,
+                recent_likes=recent_likes,
+                recent_views=recent_views,
+                refreshed_at=now,
+            )
+            for rank, (popularity, recent_likes, recent_views, movie_id) in enumerate(ranked, start=1)
+        ], batch_size=1000)
+        # Pages only show the order, so new scores alone change nothing.
+        if previous != [movie_id for *_, movie_id in ranked]:
+            transaction.on_commit(bump_popularity_version)
+    return len(ranked)
+
+
+_refreshed_at = 0.0
+_refresh_thread = None
+_refresh_lock = threading.Lock()
+
+
+def _run_background_refresh():
+    try:
+        refresh_popularity()
+    except Exception:
+        logger.exception("Background popularity refresh failed.")
+    finally:
+        connections.close_all()
+
+
+def refresh_popularity_if_stale():
+    """Refresh the ranking in a background thread once it is older than
+    POPULARITY_REFRESH_SECONDS; readers keep the previous table meanwhile."""
+    global _refreshed_at, _refresh_thread
+    interval = getattr(settings, "POPULARITY_REFRESH_SECONDS", 300)
+    if time.monotonic() - _refreshed_at < interval:
+        return
+    with _refresh_lock:
+        if time.monotonic() - _refreshed_at < interval:
+            return
+        _refreshed_at = time.monotonic()
+        last = PopularMovie.objects.order_by().values_list("refreshed_at", flat=True).first()
+        if last is not None and (timezone.now() - last).total_seconds() < interval:
+            return
+        _refresh_thread = threading.Thread(target=_run_background_refresh, name="popularity-refresh", daemon=True)
+        _refresh_thread.start()
+
+
+def get_popular_movies(queryset):
+    """Order ``queryset`` by the precomputed popularity ranking."""
+    refresh_popularity_if_stale()
+    return queryset.filter(popular_rank__isnull=False).order_by("popular_rank__rank")
@@ -1,6 +1,30 @@
+import copy
+import datetime
+import heapq
+import logging
 import math
+import threading
+import time
 from collections import Counter
-from movies.models import Movie, WatchHistory
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from movie_recommendation.metrics import span
+from movies.ann import build_ann_backend
+from movies.cache import get_recommendation_cache
+from movies.index_store import (
+    activate_version, current_index_version, index_root, is_pinned, load_index, new_version, previous_version,
+    prune_versions, store_index,
+)
+from movies.models import Movie, WatchHistory, Like, MovieSimilarity, UserTasteProfile
+
+logger = logging.getLogger(__name__)
+
+TASTE_PROFILE_EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+MAX_TASTE_WEIGHT = 1e12
+MAX_TASTE_EXPONENT = math.log2(MAX_TASTE_WEIGHT)
 
 def compute_tf(document_tokens) -> dict:
     tf_dict = {}
@@ -59,98 +83,845 @@ def cosine_similarity(vec1, vec2, all_terms_vocabulary) -> float | int:
     return dot_product / (norm_vec1 * norm_vec2)
 
 
-def get_similar_recommendation(movie_title, num_recommendations=7) -> list:
+def tokenize_tags(tags) -> list:
+    return tags.split() if tags else []
 
-    all_movies = list(Movie.objects.all())
-    if not all_movies:
-        return []
-
-    movie_data = []
-    movie_id_to_index = {}
-    index_to_movie = {}
+def top_k(scores, k) -> np.ndarray:
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
 
-    for i, movie in enumerate(all_movies):
-        movie_data.append(movie.tags if movie.tags else '')
-        movie_id_to_index[movie.id] = i
-        index_to_movie[i] = movie
-
-    idf_dict = compute_idf(movie_data)
-    
-    all_unique_terms = sorted(list(idf_dict.keys()))
+def heap_top_k(rows, scores, k) -> list:
+    best = heapq.nlargest(k, zip(scores.tolist(), (-rows).tolist()))
+    return [(-negative_row, score) for score, negative_row in best]
 
-    tfidf_vectors = compute_tfidf_vectors(movie_data, idf_dict, all_unique_terms)
+def _ranges(starts, lengths) -> np.ndarray:
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(lengths.sum())
 
-    input_movie_obj = Movie.objects.filter(title__iexact=movie_title).first()
-    if not input_movie_obj:
-        return []
+class TfidfIndex:
+    """L2-normalized TF-IDF matrix over movie tags, stored as CSR arrays.
 
-    input_movie_idx = movie_id_to_index[input_movie_obj.id]
-    input_movie_vector = tfidf_vectors[input_movie_idx]
+    Rows can be added, replaced or removed in place. Replaced and removed rows
+    are tombstoned and new rows are weighted with the current IDF, so weights
+    drift from a full rebuild until ``reweight`` recomputes them.
 
-    similarity_scores = []
-    for i, movie_vector in enumerate(tfidf_vectors):
-        if i == input_movie_idx:
-            continue
-        
-        sim_score = cosine_similarity(input_movie_vector, movie_vector, all_unique_terms)
-        similarity_scores.append((i, sim_score))
+    ``reweight`` also builds a term -> posting list inverted index (the CSC
+    transpose of the matrix). Rows appended after it live in small ``delta_*``
+    overlay arrays, so upserts never copy the (possibly memory-mapped) base
+    matrix, and are scanned directly until the next reweight folds them in.
+    """
 
-    sorted_similar_movies = sorted(similarity_scores, key=lambda x: x[1], reverse=True)
-
-    recommended_movies_list = []
-    for i, _ in sorted_similar_movies[:num_recommendations]:
-        recommended_movies_list.append(index_to_movie[i])
-
-    return recommended_movies_list
-
-def get_for_you_recommendation(user_obj, num_recommendations=7) -> list:
-
-    all_movies = list(Movie.objects.all())
-    if not all_movies or not list(WatchHistory.objects.filter(user=user_obj)):
-        return []
-
-    watched_movies_ids = set(
-        WatchHistory.objects.filter(user=user_obj).values_list('movie_id', flat=True)
+    ARRAYS = (
+        "df", "idf", "indptr", "indices", "tf", "data", "nnz_rows", "row_to_movie_id", "alive",
+        "posting_ptr", "posting_rows", "posting_data",
     )
 
-    watched_movies_data = []
-    unwatched_movies_data = []
-    unwatched_movie_objects = []
-
-    movie_id_to_index = {}
-    for i, movie in enumerate(all_movies):
-        movie_id_to_index[movie.id] = i
-        if movie.id not in watched_movies_ids:
-            unwatched_movies_data.append(movie.tags if movie.tags else '')
-            unwatched_movie_objects.append(movie)
+    def __init__(self, movie_ids, documents_tokenized, signature=None):
+        self.signature = signature
+        self.version = new_version()
+        self.built_at = timezone.now()
+        self.build_seconds = None
+        with span("vectorize"):
+            term_in_documents_count = Counter()
+            for doc_tokens in documents_tokenized:
+                term_in_documents_count.update(set(doc_tokens))
+            terms = sorted(term_in_documents_count)
+            self.terms = terms
+            self.vocabulary = {term: i for i, term in enumerate(terms)}
+            self.df = np.array([term_in_documents_count[term] for term in terms], dtype=np.int64)
+
+            indptr = [0]
+            indices = []
+            tfs = []
+            for doc_tokens in documents_tokenized:
+                for term, tf in compute_tf(doc_tokens).items():
+                    indices.append(self.vocabulary[term])
+                    tfs.append(tf)
+                indptr.append(len(indices))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int32)
+        self.tf = np.array(tfs, dtype=np.float32)
+        self.row_to_movie_id = np.array(movie_ids, dtype=np.int64)
+        self.movie_id_to_row = {int(movie_id): row for row, movie_id in enumerate(movie_ids)}
+        self.alive = np.ones(len(movie_ids), dtype=bool)
+        self.store_version = None
+        self._ann = None
+        self._reset_delta()
+        self.reweight()
+
+    @classmethod
+    def from_movies(cls, queryset=None):
+        if queryset is None:
+            queryset = Movie.objects.all()
+        started = time.perf_counter()
+        with span("load_catalog"):
+            signature = catalog_signature()
+            movie_ids = []
+            documents_tokenized = []
+            for movie_id, tags in queryset.order_by("pk").values_list("id", "tags").iterator():
+                movie_ids.append(movie_id)
+                documents_tokenized.append(tokenize_tags(tags))
+        index = cls(movie_ids, documents_tokenized, signature=signature)
+        index.build_seconds = time.perf_counter() - started
+        return index
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata, store_version=None):
+        index = cls.__new__(cls)
+        index.version = metadata.get("version") or store_version
+        index.built_at = metadata.get("built_at")
+        index.build_seconds = metadata.get("build_seconds")
+        for name in cls.ARRAYS:
+            setattr(index, name, arrays[name])
+        index.terms = arrays["terms"].tolist()
+        index.vocabulary = {term: i for i, term in enumerate(index.terms)}
+        rows = np.flatnonzero(index.alive)
+        index.movie_id_to_row = dict(zip(index.row_to_movie_id[rows].tolist(), rows.tolist()))
+        index.signature = tuple(metadata["signature"]) if metadata["signature"] else None
+        index.indexed_nnz = metadata["indexed_nnz"]
+        index.changes = metadata["changes"]
+        index.store_version = store_version
+        index._ann = None
+        index._reset_delta()
+        if index.indexed_nnz < len(index.indices):
+            # Written with rows past the postings: move them to the overlay.
+            base_rows = int(index.nnz_rows[index.indexed_nnz])
+            lo = index.indexed_nnz
+            index.delta_indptr = index.indptr[base_rows:] - lo
+            index.delta_indices = np.array(index.indices[lo:])
+            index.delta_tf = np.array(index.tf[lo:])
+            index.delta_data = np.array(index.data[lo:])
+            index.delta_nnz_rows = np.array(index.nnz_rows[lo:])
+            index.delta_movie_ids = np.array(index.row_to_movie_id[base_rows:])
+            for name in ("indices", "tf", "data", "nnz_rows"):
+                setattr(index, name, getattr(index, name)[:lo])
+            index.indptr = index.indptr[:base_rows + 1]
+            index.row_to_movie_id = index.row_to_movie_id[:base_rows]
+        return index
+
+    def to_arrays(self) -> dict:
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        if len(self.delta_movie_ids):
+            arrays.update(self._merged())
+            arrays["nnz_rows"] = np.concatenate((self.nnz_rows, self.delta_nnz_rows))
+            arrays["data"] = np.concatenate((self.data, self.delta_data))
+        arrays["terms"] = np.array(self.terms, dtype=str)
+        return arrays
+
+    def metadata(self) -> dict:
+        return {
+            "signature": self.signature,
+            "indexed_nnz": int(self.indexed_nnz),
+            "changes": self.changes,
+            "version": self.version,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+        }
+
+    def __len__(self):
+        return self.base_rows + len(self.delta_movie_ids)
+
+    @property
+    def base_rows(self) -> int:
+        return len(self.row_to_movie_id)
+
+    def _reset_delta(self):
+        self.delta_indptr = np.zeros(1, dtype=np.int64)
+        self.delta_indices = np.empty(0, dtype=np.int32)
+        self.delta_tf = np.empty(0, dtype=np.float32)
+        self.delta_data = np.empty(0, dtype=np.float32)
+        self.delta_nnz_rows = np.empty(0, dtype=np.int64)
+        self.delta_movie_ids = np.empty(0, dtype=np.int64)
+
+    def _merged(self) -> dict:
+        return {
+            "indptr": np.concatenate((self.indptr, self.indptr[-1] + self.delta_indptr[1:])),
+            "indices": np.concatenate((self.indices, self.delta_indices)),
+            "tf": np.concatenate((self.tf, self.delta_tf)),
+            "row_to_movie_id": np.concatenate((self.row_to_movie_id, self.delta_movie_ids)),
+        }
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.movie_id_to_row)
+
+    def _compute_idf(self) -> np.ndarray:
+        n_docs = max(self.n_docs, 1)
+        return (np.log(n_docs / np.maximum(self.df, 1)) + 1).astype(np.float32)
+
+    def _normalized(self, indices, tf, nnz_rows, n_rows) -> np.ndarray:
+        data = tf * self.idf[indices]
+        norms = np.sqrt(np.bincount(nnz_rows, weights=data.astype(np.float64) ** 2, minlength=n_rows))
+        norms[norms == 0] = 1
+        return (data / norms[nnz_rows]).astype(np.float32)
+
+    def reweight(self):
+        with span("build_idf"):
+            self._reweight()
+
+    def _reweight(self):
+        if len(self.delta_movie_ids):
+            for name, array in self._merged().items():
+                setattr(self, name, array)
+            self._reset_delta()
+        if not self.alive.all():
+            keep = np.repeat(self.alive, np.diff(self.indptr))
+            self.indptr = np.concatenate(([0], np.cumsum(np.diff(self.indptr)[self.alive])))
+            self.indices = self.indices[keep]
+            self.tf = self.tf[keep]
+            self.row_to_movie_id = self.row_to_movie_id[self.alive]
+            self.movie_id_to_row = {int(movie_id): row for row, movie_id in enumerate(self.row_to_movie_id)}
+            self.alive = np.ones(len(self.row_to_movie_id), dtype=bool)
+        self.idf = self._compute_idf()
+        self.nnz_rows = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+        self.data = self._normalized(self.indices, self.tf, self.nnz_rows, len(self))
+        self._build_postings()
+        self._ann = None
+        self.changes = 0
+
+    def _build_postings(self):
+        order = np.argsort(self.indices, kind="stable")
+        self.posting_rows = self.nnz_rows[order]
+        self.posting_data = self.data[order]
+        self.posting_ptr = np.concatenate(([0], np.cumsum(np.bincount(self.indices, minlength=len(self.vocabulary)))))
+        self.indexed_nnz = len(self.indices)
+
+    def copy(self):
+        index = copy.copy(self)
+        index.terms = list(self.terms)
+        index.vocabulary = dict(self.vocabulary)
+        index.movie_id_to_row = dict(self.movie_id_to_row)
+        index.alive = self.alive.copy()
+        index.df = self.df.copy()
+        index.idf = self.idf.copy()
+        return index
+
+    def drift(self) -> float:
+        return self.changes / max(self.n_docs, 1)
+
+    def _row_terms(self, doc_tokens) -> tuple:
+        tf_dict = compute_tf(doc_tokens)
+        new_terms = [term for term in tf_dict if term not in self.vocabulary]
+        for term in new_terms:
+            self.vocabulary[term] = len(self.vocabulary)
+            self.terms.append(term)
+        if new_terms:
+            self.df = np.concatenate((self.df, np.zeros(len(new_terms), dtype=np.int64)))
+            self.idf = np.concatenate((self.idf, np.ones(len(new_terms), dtype=np.float32)))
+        indices = np.array([self.vocabulary[term] for term in tf_dict], dtype=np.int32)
+        tf = np.array(list(tf_dict.values()), dtype=np.float32)
+        order = np.argsort(indices)
+        return indices[order], tf[order]
+
+    def _row_arrays(self, row) -> tuple:
+        if row < self.base_rows:
+            start, end = self.indptr[row], self.indptr[row + 1]
+            return self.indices[start:end], self.tf[start:end], self.data[start:end]
+        start, end = self.delta_indptr[row - self.base_rows], self.delta_indptr[row - self.base_rows + 1]
+        return self.delta_indices[start:end], self.delta_tf[start:end], self.delta_data[start:end]
+
+    def _rows_entries(self, rows) -> tuple:
+        """Entries of ``rows`` as (position in ``rows``, term, weight) arrays."""
+        parts = []
+        for in_part, indptr, indices, data, offset in (
+            (rows < self.base_rows, self.indptr, self.indices, self.data, 0),
+            (rows >= self.base_rows, self.delta_indptr, self.delta_indices, self.delta_data, self.base_rows),
+        ):
+            local = np.flatnonzero(in_part)
+            starts = indptr[rows[local] - offset]
+            lengths = indptr[rows[local] - offset + 1] - starts
+            positions = _ranges(starts, lengths)
+            parts.append((np.repeat(local, lengths), indices[positions], data[positions]))
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+    def movie_id_at(self, row) -> int:
+        if row < self.base_rows:
+            return int(self.row_to_movie_id[row])
+        return int(self.delta_movie_ids[row - self.base_rows])
+
+    def _drop_row(self, row):
+        indices, _, _ = self._row_arrays(row)
+        self.df[indices] -= 1
+        self.alive[row] = False
+
+    def upsert(self, movie_id, doc_tokens) -> bool:
+        indices, tf = self._row_terms(doc_tokens)
+        row = self.movie_id_to_row.get(movie_id)
+        if row is not None:
+            old_indices, old_tf, _ = self._row_arrays(row)
+            old_order = np.argsort(old_indices)
+            if np.array_equal(old_indices[old_order], indices) and np.allclose(old_tf[old_order], tf):
+                return False
+            self._drop_row(row)
+
+        new_row = len(self)
+        self.movie_id_to_row[movie_id] = new_row
+        self.df[indices] += 1
+        self.idf[indices] = np.log(self.n_docs / self.df[indices]) + 1
+        self.delta_indptr = np.append(self.delta_indptr, self.delta_indptr[-1] + len(indices))
+        self.delta_indices = np.concatenate((self.delta_indices, indices))
+        self.delta_tf = np.concatenate((self.delta_tf, tf))
+        self.delta_nnz_rows = np.concatenate((self.delta_nnz_rows, np.full(len(indices), new_row, dtype=np.int64)))
+        self.delta_data = np.concatenate((self.delta_data, self._normalized(indices, tf, np.zeros(len(indices), dtype=np.int64), 1)))
+        self.delta_movie_ids = np.append(self.delta_movie_ids, movie_id)
+        self.alive = np.append(self.alive, True)
+        self.changes += 1
+        return True
+
+    def remove(self, movie_id) -> bool:
+        row = self.movie_id_to_row.pop(movie_id, None)
+        if row is None:
+            return False
+        self._drop_row(row)
+        self.changes += 1
+        return True
+
+    def row(self, row) -> tuple:
+        indices, _, data = self._row_arrays(row)
+        return indices, data
+
+    def score_vector(self, indices, data) -> np.ndarray:
+        query = np.zeros(len(self.vocabulary), dtype=np.float32)
+        query[indices] = data
+        return self.score_query(query)
+
+    def score_query(self, query) -> np.ndarray:
+        scores = np.concatenate((
+            np.bincount(self.nnz_rows, weights=self.data * query[self.indices], minlength=self.base_rows),
+            np.bincount(self.delta_nnz_rows - self.base_rows, weights=self.delta_data * query[self.delta_indices],
+                        minlength=len(self.delta_movie_ids)),
+        ))
+        scores[~self.alive] = -np.inf
+        return scores
+
+    def profile(self, movie_weights) -> np.ndarray:
+        rows = []
+        weights = []
+        for movie_id, weight in movie_weights.items():
+            row = self.movie_id_to_row.get(movie_id)
+            if row is not None:
+                rows.append(row)
+                weights.append(weight)
+        profile = np.zeros(len(self.vocabulary), dtype=np.float32)
+        if not rows:
+            return profile
+        local, indices, data = self._rows_entries(np.array(rows, dtype=np.int64))
+        row_weights = np.array(weights, dtype=np.float32)[local]
+        profile += np.bincount(indices, weights=data * row_weights, minlength=len(profile)).astype(np.float32)
+        return profile
+
+    def row_terms(self, movie_id) -> dict:
+        row = self.movie_id_to_row.get(movie_id)
+        if row is None:
+            return {}
+        indices, data = self.row(row)
+        return {self.terms[i]: float(weight) for i, weight in zip(indices, data)}
+
+    def terms_to_query(self, term_weights) -> tuple:
+        indices = []
+        data = []
+        for term, weight in term_weights.items():
+            col = self.vocabulary.get(term)
+            if col is not None and weight:
+                indices.append(col)
+                data.append(weight)
+        return np.array(indices, dtype=np.int32), np.array(data, dtype=np.float32)
+
+    def candidate_scores(self, indices, data) -> tuple:
+        indexed = indices < len(self.posting_ptr) - 1
+        starts = self.posting_ptr[indices[indexed]]
+        lengths = self.posting_ptr[indices[indexed] + 1] - starts
+        positions = _ranges(starts, lengths)
+        rows = self.posting_rows[positions]
+        weights = self.posting_data[positions] * np.repeat(data[indexed], lengths)
+
+        if len(self.delta_indices):
+            query = np.zeros(len(self.vocabulary), dtype=np.float32)
+            query[indices] = data
+            delta_weights = self.delta_data * query[self.delta_indices]
+            matched = delta_weights != 0
+            rows = np.concatenate((rows, self.delta_nnz_rows[matched]))
+            weights = np.concatenate((weights, delta_weights[matched]))
+
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights, minlength=len(candidates))
+        alive = self.alive[candidates]
+        return candidates[alive], scores[alive]
+
+    def ann(self):
+        if self._ann is None:
+            self._ann = build_ann_backend(self)
+        return self._ann
+
+    def score_rows(self, rows, query) -> np.ndarray:
+        local, indices, data = self._rows_entries(rows)
+        return np.bincount(local, weights=data * query[indices], minlength=len(rows))
+
+    def ann_candidate_scores(self, indices, data, backend=None) -> tuple:
+        backend = backend or self.ann()
+        rows = backend.candidates(indices, data)
+        if backend.n_rows < len(self):
+            rows = np.concatenate((rows, np.arange(backend.n_rows, len(self))))
+        rows = rows[self.alive[rows]]
+        query = np.zeros(len(self.vocabulary), dtype=np.float32)
+        query[indices] = data
+        return rows, self.score_rows(rows, query)
+
+    def search(self, indices, data, k, exclude_rows=(), mode=None, backend=None) -> list:
+        excluded = set(exclude_rows)
+
+        def without_excluded(candidates, scores) -> tuple:
+            if not excluded:
+                return candidates, scores
+            keep = ~np.isin(candidates, list(excluded))
+            return candidates[keep], scores[keep]
+
+        with span("score"):
+            candidates = None
+            if resolve_search_mode(mode) == "ann":
+                candidates, scores = without_excluded(*self.ann_candidate_scores(indices, data, backend))
+                # The probed buckets held fewer than k movies: score exactly
+                # rather than pad the results with non-matches.
+                if len(candidates) < k:
+                    candidates = None
+            if candidates is None:
+                candidates, scores = without_excluded(*self.candidate_scores(indices, data))
+        with span("sort"):
+            best = heap_top_k(candidates, scores, k)
+
+            # Movies sharing no terms with the query score zero; fill any
+            # remaining slots with them in row order, as a full scan would.
+            if len(best) < k:
+                chosen = excluded | {row for row, _ in best}
+                for row in np.flatnonzero(self.alive):
+                    if len(best) >= k:
+                        break
+                    if row not in chosen:
+                        best.append((int(row), 0.0))
+        return [(self.movie_id_at(row), float(score)) for row, score in best]
+
+    def recommend(self, indices, data, k, exclude_ids=(), mode=None, backend=None) -> list:
+        excluded = [self.movie_id_to_row[movie_id] for movie_id in exclude_ids if movie_id in self.movie_id_to_row]
+        return self.search(indices, data, k, excluded, mode, backend)
+
+    def similar(self, movie_id, k, mode=None, backend=None) -> list:
+        row = self.movie_id_to_row.get(movie_id)
+        if row is None:
+            return []
+        return self.search(*self.row(row), k, (row,), mode, backend)
+
+def resolve_search_mode(mode=None) -> str:
+    return mode or getattr(settings, "RECOMMENDATION_SEARCH_MODE", "exact")
+
+def catalog_signature() -> tuple:
+    stats = Movie.objects.aggregate(count=Count("id"), last_updated=Max("updated_at"))
+    return (stats["count"], stats["last_updated"])
+
+_index = None
+_previous_index = None
+_index_lock = threading.Lock()
+_rebuild_thread = None
+_rebuild_lock = threading.Lock()
+_rebuild_state = {"started_at": None, "finished_at": None, "error": None}
+_pinned = False
+
+class IndexBuildError(Exception):
+    pass
+
+def load_stored_index(version) -> TfidfIndex | None:
+    if version is None:
+        return None
+    manifest, arrays = load_index(version)
+    return TfidfIndex.from_arrays(arrays, manifest["metadata"]["tfidf"], version)
+
+def validate_index(index, signature=None) -> list:
+    problems = []
+    if len(index.indptr) != index.base_rows + 1 or index.indptr[-1] != len(index.indices):
+        problems.append("row pointers do not match the matrix")
+    if not np.isfinite(index.data).all():
+        problems.append("weights contain NaN or infinite values")
+    if signature is not None and signature[0]:
+        threshold = getattr(settings, "RECOMMENDATION_REWEIGHT_THRESHOLD", 0.1)
+        if abs(index.n_docs - signature[0]) > threshold * signature[0]:
+            problems.append(f"index has {index.n_docs} movies but the catalog has {signature[0]}")
+    return problems
+
+def index_pinned() -> bool:
+    return is_pinned() if index_root() is not None else _pinned
+
+def swap_index(index, automatic=False) -> bool:
+    """Swap ``index`` in. Automatic swaps are refused while a rollback is
+    pinned; any other swap clears the pin."""
+    global _index, _previous_index, _pinned
+    with _index_lock:
+        if automatic and index_pinned():
+            return False
+        if not automatic:
+            _pinned = False
+        if _index is not None and _index.version != index.version:
+            _previous_index = _index
+        _index = index
+        return True
+
+def rebuild_index(store=None, automatic=False) -> TfidfIndex | None:
+    """Build a new index version from the database, validate it and swap it
+    in. Readers keep using the old version until the swap.
+
+    Explicit rebuilds write a new stored version when RECOMMENDATION_INDEX_DIR
+    is set and prune old ones. Automatic rebuilds stay in this process's
+    memory, so workers never race to write versions, and return None
+    instead of undoing a pinned rollback.
+    """
+    index = TfidfIndex.from_movies()
+    problems = validate_index(index, catalog_signature())
+    if problems:
+        raise IndexBuildError(f"Recommendation index {index.version} rejected: {'; '.join(problems)}.")
+    if store is None:
+        store = index_root() is not None and not automatic
+    if store:
+        from movies.embeddings import EmbeddingIndex
+        store_index(index, EmbeddingIndex.from_db(index))
+        index.store_version = index.version
+        prune_versions()
+    else:
+        # Replaces the stored version in this process until CURRENT moves.
+        index.store_version = current_index_version()
+    return index if swap_index(index, automatic) else None
+
+def _run_background_rebuild():
+    _rebuild_state["started_at"] = timezone.now()
+    try:
+        index = rebuild_index(automatic=True)
+        _rebuild_state["error"] = None
+        if index is None:
+            logger.info("Recommendation index rebuild discarded: a rolled-back version is pinned.")
         else:
-            watched_movies_data.append(movie.tags if movie.tags else '')
-
-    if not unwatched_movies_data:
+            logger.info("Recommendation index %s built in %.2fs.", index.version, index.build_seconds)
+    except Exception as error:
+        _rebuild_state["error"] = str(error)
+        logger.exception("Background recommendation index rebuild failed.")
+    finally:
+        _rebuild_state["finished_at"] = timezone.now()
+        connections.close_all()
+
+def rebuild_index_in_background() -> threading.Thread:
+    global _rebuild_thread
+    with _rebuild_lock:
+        if _rebuild_thread is None or not _rebuild_thread.is_alive():
+            _rebuild_thread = threading.Thread(target=_run_background_rebuild, name="recommendation-index-rebuild", daemon=True)
+            _rebuild_thread.start()
+        return _rebuild_thread
+
+def schedule_rebuild():
+    if index_pinned():
+        return
+    retry_after = getattr(settings, "RECOMMENDATION_REBUILD_RETRY_SECONDS", 60)
+    finished_at = _rebuild_state["finished_at"]
+    if _rebuild_state["error"] and finished_at and (timezone.now() - finished_at).total_seconds() < retry_after:
+        return
+    rebuild_index_in_background()
+
+def rollback_index() -> TfidfIndex | None:
+    """Switch back to the previous version and pin it until the next
+    explicit rebuild."""
+    global _index, _previous_index, _pinned
+    if index_root() is not None:
+        current = current_index_version()
+        previous = previous_version(current) if current else None
+        if previous is None:
+            return None
+        activate_version(previous, pin=True)
+        return get_index()
+    with _index_lock:
+        if _previous_index is None:
+            return None
+        _index, _previous_index = _previous_index, _index
+        _pinned = True
+        return _index
+
+def index_status() -> dict:
+    index = _index
+    thread = _rebuild_thread
+    if index_root() is not None:
+        current = current_index_version()
+        previous = previous_version(current) if current else None
+    else:
+        previous = _previous_index.version if _previous_index is not None else None
+    return {
+        "version": index.version if index else None,
+        "store_version": index.store_version if index else None,
+        "built_at": index.built_at if index else None,
+        "build_seconds": index.build_seconds if index else None,
+        "movies": index.n_docs if index else 0,
+        "changes_since_build": index.changes if index else 0,
+        "previous_version": previous,
+        "pinned": index_pinned(),
+        "rebuilding": thread is not None and thread.is_alive(),
+        "last_rebuild_started_at": _rebuild_state["started_at"],
+        "last_rebuild_finished_at": _rebuild_state["finished_at"],
+        "last_rebuild_error": _rebuild_state["error"],
+    }
+
+def catch_up(index, signature) -> TfidfIndex:
+    """Apply catalog changes made since ``index`` was built. When too much has
+    changed, keep serving ``index`` and rebuild in the background instead."""
+    threshold = getattr(settings, "RECOMMENDATION_REWEIGHT_THRESHOLD", 0.1)
+    changed = Movie.objects.all()
+    if index.signature and index.signature[1] is not None:
+        changed = changed.filter(updated_at__gte=index.signature[1])
+    if changed.count() > threshold * max(index.n_docs, 1):
+        schedule_rebuild()
+        return index
+
+    index = index.copy()
+    for movie_id, tags in changed.values_list("id", "tags").iterator():
+        index.upsert(movie_id, tokenize_tags(tags))
+    if index.n_docs != signature[0]:
+        existing = set(Movie.objects.values_list("id", flat=True))
+        for movie_id in [movie_id for movie_id in index.movie_id_to_row if movie_id not in existing]:
+            index.remove(movie_id)
+    if index.drift() > threshold:
+        schedule_rebuild()
+    index.signature = signature
+    return index
+
+def get_index() -> TfidfIndex:
+    global _index
+    signature = catalog_signature()
+    version = current_index_version()
+    index = _index
+    if index is not None and index.signature == signature and index.store_version == version:
+        return index
+    with _index_lock:
+        if _index is None or _index.store_version != version:
+            _index = load_stored_index(version) or TfidfIndex.from_movies()
+        if _index.signature != signature:
+            _index = catch_up(_index, signature)
+        return _index
+
+def invalidate_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+def similarity_rows(index, movie_ids, top_k):
+    for movie_id in movie_ids:
+        for rank, (neighbor_id, score) in enumerate(index.similar(movie_id, top_k), start=1):
+            yield MovieSimilarity(movie_id=movie_id, neighbor_id=neighbor_id, score=score, rank=rank)
+
+def bulk_create_similarities(rows, batch_size=1000) -> int:
+    created = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            MovieSimilarity.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+            batch = []
+    if batch:
+        MovieSimilarity.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+def rebuild_similarities(index=None, top_k=None, batch_size=1000) -> int:
+    if index is None:
+        index = get_index()
+    if top_k is None:
+        top_k = getattr(settings, "SIMILAR_MOVIES_TOP_K", 20)
+    movie_ids = list(index.movie_id_to_row)
+    with transaction.atomic():
+        MovieSimilarity.objects.all().delete()
+        return bulk_create_similarities(similarity_rows(index, movie_ids, top_k), batch_size)
+
+def refresh_similarities(index, movie_ids, top_k=None) -> int:
+    if top_k is None:
+        top_k = getattr(settings, "SIMILAR_MOVIES_TOP_K", 20)
+    movie_ids = [movie_id for movie_id in movie_ids if movie_id in index.movie_id_to_row]
+    with transaction.atomic():
+        MovieSimilarity.objects.filter(movie_id__in=movie_ids).delete()
+        return bulk_create_similarities(similarity_rows(index, movie_ids, top_k))
+
+def similarity_dependents(movie_id) -> set:
+    return set(MovieSimilarity.objects.filter(neighbor_id=movie_id).values_list("movie_id", flat=True))
+
+def _apply_to_index(update) -> TfidfIndex | None:
+    global _index
+    with _index_lock:
+        if _index is None:
+            return None
+        index = _index.copy()
+        changed = update(index)
+        index.signature = catalog_signature()
+        _index = index
+    if index.drift() > getattr(settings, "RECOMMENDATION_REWEIGHT_THRESHOLD", 0.1):
+        schedule_rebuild()
+    return index if changed else None
+
+def sync_movie(movie_id, tags):
+    dependents = similarity_dependents(movie_id)
+    if _index is None:
+        index = get_index()
+    else:
+        index = _apply_to_index(lambda index: index.upsert(movie_id, tokenize_tags(tags)))
+        if index is None:
+            return
+    top_k = getattr(settings, "SIMILAR_MOVIES_TOP_K", 20)
+    affected = {movie_id, *dependents}
+    affected.update(neighbor_id for neighbor_id, _ in index.similar(movie_id, top_k))
+    refresh_similarities(index, affected, top_k)
+
+def forget_movie(movie_id, dependents=()):
+    index = _apply_to_index(lambda index: index.remove(movie_id))
+    if index is None:
+        index = get_index()
+    refresh_similarities(index, set(dependents) - {movie_id})
+
+def get_stored_similar_recommendation(movie, num_recommendations=7) -> list:
+    similar_movies = [
+        similarity.neighbor
+        for similarity in MovieSimilarity.objects.filter(movie=movie).select_related("neighbor").order_by("rank")[:num_recommendations]
+    ]
+    if similar_movies:
+        return similar_movies
+    return get_similar_recommendation(movie.title, num_recommendations)
+
+def get_similar_recommendation(movie_title, num_recommendations=7, mode=None) -> list:
+    input_movie_obj = Movie.objects.filter(title__iexact=movie_title).first()
+    if not input_movie_obj:
         return []
 
-    user_profile_tags = " ".join(watched_movies_data)
-    if not user_profile_tags.strip():
-        return list(Movie.objects.exclude(id__in=watched_movies_ids).order_by('?')[:num_recommendations])
-
-
-    all_corpus_tags = [user_profile_tags] + unwatched_movies_data
-    
-    idf_dict = compute_idf(all_corpus_tags)
-    all_unique_terms = sorted(list(idf_dict.keys()))
-
-    tfidf_vectors = compute_tfidf_vectors(all_corpus_tags, idf_dict, all_unique_terms)
-
-    user_profile_vector = tfidf_vectors[0]
-
-    similarity_scores = []
-    for i, movie_vector in enumerate(tfidf_vectors[1:]):
-        unwatched_movie_obj = unwatched_movie_objects[i]
-        sim_score = cosine_similarity(user_profile_vector, movie_vector, all_unique_terms)
-        similarity_scores.append((unwatched_movie_obj, sim_score))
+    neighbors = []
+    if resolve_search_mode(mode) == "embedding":
+        from movies.embeddings import get_embedding_index
+        embedding_index = get_embedding_index()
+        if embedding_index is not None:
+            neighbors = embedding_index.similar(input_movie_obj.id, num_recommendations)
+    if not neighbors:
+        neighbors = get_index().similar(input_movie_obj.id, num_recommendations, mode)
+    with span("load_movies"):
+        movies = Movie.objects.in_bulk([movie_id for movie_id, _ in neighbors])
+    return [movies[movie_id] for movie_id, _ in neighbors if movie_id in movies]
+
+def _event_growth(when) -> float:
+    """log2 of the forward-decay multiplier 2^(age / half_life) of an event.
+    Kept in log space: the multiplier itself overflows a float once the age
+    since TASTE_PROFILE_EPOCH passes ~1024 half-lives."""
+    half_life = getattr(settings, "TASTE_PROFILE_HALF_LIFE_DAYS", 0)
+    if not half_life:
+        return 0.0
+    age_days = (when - TASTE_PROFILE_EPOCH).total_seconds() / 86400
+    return age_days / half_life
+
+def _rescale_profile(profile, log2_ratio):
+    ratio = 2.0 ** log2_ratio
+    profile.weights = {term: value * ratio for term, value in profile.weights.items() if value * ratio > 0}
+    profile.log2_scale += log2_ratio
+
+def _add_to_profile(profile, term_weights, weight, growth=0.0):
+    exponent = growth + profile.log2_scale
+    if exponent > MAX_TASTE_EXPONENT:
+        # The profile was idle for many half-lives: shrink the old weights
+        # (possibly to nothing) so the new event's factor stays finite.
+        _rescale_profile(profile, MAX_TASTE_EXPONENT - exponent)
+        exponent = MAX_TASTE_EXPONENT
+    factor = weight * 2.0 ** exponent
+    for term, value in term_weights.items():
+        total = profile.weights.get(term, 0) + factor * value
+        if total > abs(factor * value) * 1e-6:
+            profile.weights[term] = total
+        else:
+            profile.weights.pop(term, None)
+
+    largest = max(profile.weights.values(), default=0)
+    if largest > MAX_TASTE_WEIGHT:
+        _rescale_profile(profile, -math.log2(largest))
+
+def rebuild_taste_profile(user, index=None) -> UserTasteProfile:
+    if index is None:
+        index = get_index()
+    like_weight = getattr(settings, "TASTE_PROFILE_LIKE_WEIGHT", 2.0)
+    profile, _ = UserTasteProfile.objects.get_or_create(user=user)
+    profile.weights = {}
+    profile.log2_scale = 0.0
+    watched_movies = set()
+    for movie_id, created_at in WatchHistory.objects.filter(user=user).values_list("movie_id", "created_at").iterator():
+        watched_movies.add(movie_id)
+        _add_to_profile(profile, index.row_terms(movie_id), 1.0, _event_growth(created_at))
+    for movie_id, created_at in Like.objects.filter(user=user).values_list("movie_id", "created_at"):
+        _add_to_profile(profile, index.row_terms(movie_id), like_weight, _event_growth(created_at))
+    profile.watched_movies = sorted(watched_movies)
+    profile.save()
+    return profile
+
+def get_taste_profile(user) -> UserTasteProfile:
+    profile = UserTasteProfile.objects.filter(user=user).first()
+    if profile is None:
+        profile = rebuild_taste_profile(user)
+    return profile
+
+def _update_taste_profile(user, movie_id, weight, growth, watched=False):
+    term_weights = get_index().row_terms(movie_id)
+    with transaction.atomic():
+        profile = UserTasteProfile.objects.select_for_update().filter(user=user).first()
+        if profile is None:
+            rebuild_taste_profile(user)
+            return
+        _add_to_profile(profile, term_weights, weight, growth)
+        if watched and movie_id not in profile.watched_movies:
+            profile.watched_movies.append(movie_id)
+        profile.save()
+
+def record_watch(user, movie_id, watched_at=None):
+    _update_taste_profile(user, movie_id, 1.0, _event_growth(watched_at or timezone.now()), watched=True)
+    get_recommendation_cache().bump_user(user.pk)
+
+def record_like(user, movie_id, liked_at, liked=True):
+    weight = getattr(settings, "TASTE_PROFILE_LIKE_WEIGHT", 2.0)
+    _update_taste_profile(user, movie_id, weight if liked else -weight, _event_growth(liked_at))
+    get_recommendation_cache().bump_user(user.pk)
+
+def get_for_you_recommendation(user_obj, num_recommendations=7, mode=None) -> list:
+    with span("load_profile"):
+        profile = get_taste_profile(user_obj)
+    if not profile.watched_movies:
+        return []
 
-    sorted_recommendations = sorted(similarity_scores, key=lambda x: x[1], reverse=True)
-    
-    recommended_movies_list = [movie_obj for movie_obj, score in sorted_recommendations[:num_recommendations]]
+    index = get_index()
+    watched_in_index = sum(1 for movie_id in profile.watched_movies if movie_id in index.movie_id_to_row)
+    if index.n_docs - watched_in_index <= 0:
+        return []
 
-    return recommended_movies_list
\ No newline at end of file
+    with span("vectorize"):
+        query_indices, query_data = index.terms_to_query(profile.weights)
+    if not len(query_indices):
+        return list(Movie.objects.exclude(id__in=profile.watched_movies).order_by('?')[:num_recommendations])
+
+    recommendations = []
+    if resolve_search_mode(mode) == "embedding":
+        from movies.embeddings import get_embedding_index
+        embedding_index = get_embedding_index()
+        if embedding_index is not None:
+            user_embedding = embedding_index.project(query_indices, query_data, index)
+            recommendations = embedding_index.recommend(user_embedding, num_recommendations, profile.watched_movies)
+    if not recommendations:
+        recommendations = index.recommend(query_indices, query_data, num_recommendations, profile.watched_movies, mode)
+    with span("load_movies"):
+        movies = Movie.objects.in_bulk([movie_id for movie_id, _ in recommendations])
+    return [movies[movie_id] for movie_id, _ in recommendations if movie_id in movies]
+
+def get_cached_for_you_recommendation(user_obj, num_recommendations=7) -> list:
+    cache = get_recommendation_cache()
+    movie_ids = cache.get("for_you", user_obj.pk, num_recommendations)
+    if movie_ids is None:
+        recommended_movies_list = get_for_you_recommendation(user_obj, num_recommendations)
+        cache.set("for_you", user_obj.pk, num_recommendations, value=[movie.id for movie in recommended_movies_list])
+        return recommended_movies_list
+
+    movies = Movie.objects.in_bulk(movie_ids)
+    return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
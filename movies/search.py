@@ -0,0 +1,198 @@
+import re
+import threading
+import numpy as np
+from django.conf import settings
+from movies.models import Movie
+from movies.recommendation import catalog_signature
+from movies.tokenizer import stem, stop_words
+
+WORD = re.compile(r"\w+")
+
+
+def analyze(text) -> list:
+    excluded = stop_words()
+    return [stem(word) for word in WORD.findall(text.lower()) if word not in excluded]
+
+
+class SearchIndex:
+    """BM25 over an in-memory inverted index of title, description and tags.
+
+    Postings map term -> {row: weighted term frequency}. Title terms count
+    ``title_weight`` times. Tags are already stemmed by the tokenizer, so they
+    are split as-is. Updates edit postings in place, so the index never needs
+    a full rebuild to stay current.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, title_weight=3):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+        self.postings = {}
+        self.doc_terms = {}
+        self.movie_id_to_row = {}
+        self.row_to_movie_id = []
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.free_rows = []
+        self.total_length = 0.0
+        self.signature = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_movies(cls, **options):
+        index = cls(**options)
+        signature = catalog_signature()
+        movies = Movie.objects.values_list("id", "title", "description", "tags")
+        for movie_id, title, description, tags in movies.iterator(chunk_size=2000):
+            index.upsert(movie_id, title, description, tags)
+        index.signature = signature
+        return index
+
+    def __len__(self):
+        return len(self.movie_id_to_row)
+
+    def _term_frequencies(self, title, description, tags) -> dict:
+        frequencies = {}
+        for term in analyze(title):
+            frequencies[term] = frequencies.get(term, 0) + self.title_weight
+        for term in analyze(description) + (tags or "").split():
+            frequencies[term] = frequencies.get(term, 0) + 1
+        return frequencies
+
+    def _allocate_row(self, movie_id) -> int:
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.row_to_movie_id[row] = movie_id
+        else:
+            row = len(self.row_to_movie_id)
+            self.row_to_movie_id.append(movie_id)
+            if row >= len(self.lengths):
+                lengths = np.zeros(max(2 * len(self.lengths), 1024), dtype=np.float32)
+                lengths[:len(self.lengths)] = self.lengths
+                self.lengths = lengths
+        self.movie_id_to_row[movie_id] = row
+        return row
+
+    def _drop_row(self, row):
+        for term in self.doc_terms.pop(row):
+            postings = self.postings[term]
+            del postings[row]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= float(self.lengths[row])
+        self.lengths[row] = 0
+
+    def upsert(self, movie_id, title, description, tags):
+        frequencies = self._term_frequencies(title, description, tags)
+        with self._lock:
+            row = self.movie_id_to_row.get(movie_id)
+            if row is None:
+                row = self._allocate_row(movie_id)
+            else:
+                self._drop_row(row)
+            for term, frequency in frequencies.items():
+                self.postings.setdefault(term, {})[row] = frequency
+            self.doc_terms[row] = list(frequencies)
+            length = sum(frequencies.values())
+            self.lengths[row] = length
+            self.total_length += length
+
+    def remove(self, movie_id) -> bool:
+        with self._lock:
+            row = self.movie_id_to_row.pop(movie_id, None)
+            if row is None:
+                return False
+            self._drop_row(row)
+            self.row_to_movie_id[row] = None
+            self.free_rows.append(row)
+            return True
+
+    def search(self, query) -> list:
+        """Return the ids of every movie matching ``query``, best first."""
+        terms = set(analyze(query))
+        with self._lock:
+            n_docs = len(self.movie_id_to_row)
+            if not terms or not n_docs:
+                return []
+            average_length = self.total_length / n_docs
+            norms = self.k1 * (1 - self.b + self.b * self.lengths[:len(self.row_to_movie_id)] / average_length)
+            scores = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+                frequencies = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+                idf = np.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                contributions = idf * frequencies * (self.k1 + 1) / (frequencies + norms[rows])
+                scores[term] = (rows, contributions)
+            if not scores:
+                return []
+            rows = np.concatenate([rows for rows, _ in scores.values()])
+            contributions = np.concatenate([contributions for _, contributions in scores.values()])
+            matched, inverse = np.unique(rows, return_inverse=True)
+            totals = np.bincount(inverse, weights=contributions)
+            order = np.argsort(-totals, kind="stable")
+            return [self.row_to_movie_id[row] for row in matched[order].tolist()]
+
+
+class RankedMovies:
+    """Lazily load a ranked id list as Movies, one paginator slice at a time."""
+
+    def __init__(self, movie_ids, queryset):
+        self.movie_ids = movie_ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def count(self) -> int:
+        return len(self.movie_ids)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        movie_ids = self.movie_ids[item]
+        movies = self.queryset.in_bulk(movie_ids)
+        return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+
+def catch_up(index, signature):
+    changed = Movie.objects.all()
+    if index.signature and index.signature[1] is not None:
+        changed = changed.filter(updated_at__gte=index.signature[1])
+    for movie_id, title, description, tags in changed.values_list("id", "title", "description", "tags").iterator():
+        index.upsert(movie_id, title, description, tags)
+    if len(index) != signature[0]:
+        existing = set(Movie.objects.values_list("id", flat=True))
+        for movie_id in [movie_id for movie_id in index.movie_id_to_row if movie_id not in existing]:
+            index.remove(movie_id)
+    index.signature = signature
+
+
+def get_search_index() -> SearchIndex:
+    global _search_index
+    signature = catalog_signature()
+    index = _search_index
+    if index is not None and index.signature == signature:
+        return index
+    with _search_index_lock:
+        if _search_index is None:
+            _search_index = SearchIndex.from_movies(**getattr(settings, "MOVIE_SEARCH", {}))
+        if _search_index.signature != signature:
+            catch_up(_search_index, signature)
+        return _search_index
+
+
+def invalidate_search_index():
+    global _search_index
+    with _search_index_lock:
+        _search_index = None
+
+
+def search_movies(query) -> list:
+    return get_search_index().search(query)
+
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from movies.cache import bump_catalog_version, get_recommendation_cache
+from movies.counters import add_to_counters
+from movies.models import Genre, Language, Like, Movie, View
+from movies.popularity import bump_daily_stats
+from movies.recommendation import forget_movie, similarity_dependents, sync_movie
+
+
+@receiver(post_save, sender=Movie)
+def update_recommendation_index(sender, instance, **kwargs):
+    movie_id, tags = instance.pk, instance.tags
+    transaction.on_commit(lambda: sync_movie(movie_id, tags))
+    transaction.on_commit(get_recommendation_cache().bump_catalog)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def invalidate_catalog_fragments(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(pre_delete, sender=Movie)
+def collect_similarity_dependents(sender, instance, **kwargs):
+    instance._similarity_dependents = similarity_dependents(instance.pk)
+
+
+@receiver(post_delete, sender=Movie)
+def remove_from_recommendation_index(sender, instance, **kwargs):
+    movie_id = instance.pk
+    dependents = getattr(instance, "_similarity_dependents", ())
+    transaction.on_commit(lambda: forget_movie(movie_id, dependents))
+    transaction.on_commit(get_recommendation_cache().bump_catalog)
+
+
+@receiver(post_save, sender=Like)
+def count_like(sender, instance, created, **kwargs):
+    if created:
+        add_to_counters(instance.movie_id, likes=1)
+        bump_daily_stats(instance.movie_id, likes=1, day=timezone.localdate(instance.created_at))
+
+
+@receiver(post_delete, sender=Like)
+def uncount_like(sender, instance, origin=None, **kwargs):
+    # Likes cascading from a movie deletion have nothing left to count.
+    if isinstance(origin, Movie) or getattr(origin, "model", None) is Movie:
+        return
+    add_to_counters(instance.movie_id, likes=-1)
+    bump_daily_stats(instance.movie_id, likes=-1, day=timezone.localdate(instance.created_at))
+
+
+@receiver(post_save, sender=View)
+def count_view(sender, instance, created, **kwargs):
+    if created:
+        add_to_counters(instance.movie_id, views=1)
+        bump_daily_stats(instance.movie_id, views=1, day=timezone.localdate(instance.created_at))
@@ -0,0 +1,136 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+from django.db import transaction
+from movies.ann import segment_sums
+from movies.models import MovieSimilarity
+from movies.recommendation import bulk_create_similarities
+
+_matrix = None
+
+
+def _init_worker(matrix):
+    global _matrix
+    _matrix = matrix
+
+
+def block_size_for_budget(n_rows, n_terms, memory_budget) -> int:
+    # Per query row a block holds a float32 query column and product slice
+    # (n_terms each), a float32 score column plus its negation and the int64
+    # argpartition output (n_rows each).
+    bytes_per_row = 8 * n_terms + 16 * n_rows
+    return max(1, int(memory_budget // bytes_per_row))
+
+
+def top_k_block(start, end, top_k) -> tuple:
+    """Score rows ``start:end`` against every row as X[start:end] @ X^T and
+    return each row's ``top_k`` neighbour rows and scores."""
+    matrix = _matrix
+    indptr, indices, data = matrix["indptr"], matrix["indices"], matrix["data"]
+    n_rows = len(indptr) - 1
+    block = end - start
+
+    queries = np.zeros((matrix["n_terms"], block), dtype=np.float32)
+    lo, hi = indptr[start], indptr[end]
+    query_columns = np.repeat(np.arange(block), np.diff(indptr[start:end + 1]))
+    queries[indices[lo:hi], query_columns] = data[lo:hi]
+
+    scores = np.empty((n_rows, block), dtype=np.float32)
+    average_nnz = max(len(indices) / max(n_rows, 1), 1)
+    chunk_rows = max(1, int(matrix["n_terms"] / average_nnz))
+    for chunk_start in range(0, n_rows, chunk_rows):
+        chunk_end = min(chunk_start + chunk_rows, n_rows)
+        c_lo, c_hi = indptr[chunk_start], indptr[chunk_end]
+        products = data[c_lo:c_hi, None] * queries[indices[c_lo:c_hi]]
+        scores[chunk_start:chunk_end] = segment_sums(
+            products, indptr[chunk_start:chunk_end] - c_lo, np.diff(indptr[chunk_start:chunk_end + 1])
+        )
+
+    scores[start + np.arange(block), np.arange(block)] = -np.inf
+    k = min(top_k, n_rows - 1)
+    neighbors = np.empty((block, max(k, 0)), dtype=np.int64)
+    neighbor_scores = np.empty((block, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return start, neighbors, neighbor_scores
+    # Order ties by row like TfidfIndex.similar: take everything above the
+    # k-th best score, then the lowest rows that tie with it.
+    for column in range(block):
+        column_scores = scores[:, column]
+        kth = column_scores[np.argpartition(-column_scores, k - 1)[k - 1]]
+        above = np.flatnonzero(column_scores > kth)
+        rows = np.concatenate((above, np.flatnonzero(column_scores == kth)[:k - len(above)]))
+        rows = rows[np.lexsort((rows, -column_scores[rows]))]
+        neighbors[column] = rows
+        neighbor_scores[column] = column_scores[rows]
+    return start, neighbors, neighbor_scores
+
+
+def build_similarity_table(index, top_k, workers=None, memory_budget=256 * 1024 ** 2, batch_size=1000, progress=None) -> dict:
+    """Compute every movie's top-K neighbours in row blocks across a process
+    pool and stream them into MovieSimilarity as blocks complete.
+
+    Each block replaces its movies' rows in its own transaction, so readers
+    always see a full neighbour list and an interrupted build keeps the
+    finished blocks."""
+    if index.base_rows < len(index) or not index.alive.all():
+        index = index.copy()
+        index.reweight()
+
+    n_rows = len(index)
+    workers = workers or os.cpu_count() or 1
+    block_size = block_size_for_budget(n_rows, len(index.vocabulary), memory_budget)
+    matrix = {
+        "indptr": np.asarray(index.indptr),
+        "indices": np.asarray(index.indices),
+        "data": np.asarray(index.data),
+        "n_terms": len(index.vocabulary),
+    }
+    blocks = [(start, min(start + block_size, n_rows)) for start in range(0, n_rows, block_size)]
+    movie_ids = np.asarray(index.row_to_movie_id)
+    started = time.perf_counter()
+    stats = {"movies": n_rows, "blocks": len(blocks), "block_size": block_size, "workers": workers, "rows": 0, "done": 0}
+
+    def rows_for(start, neighbors, scores):
+        for offset, (neighbor_rows, neighbor_scores) in enumerate(zip(neighbors, scores)):
+            movie_id = int(movie_ids[start + offset])
+            for rank, (row, score) in enumerate(zip(neighbor_rows.tolist(), neighbor_scores.tolist()), start=1):
+                yield MovieSimilarity(movie_id=movie_id, neighbor_id=int(movie_ids[row]), score=score, rank=rank)
+
+    def store(result):
+        start, neighbors, scores = result
+        block_ids = movie_ids[start:start + len(neighbors)].tolist()
+        with transaction.atomic():
+            for chunk in range(0, len(block_ids), batch_size):
+                MovieSimilarity.objects.filter(movie_id__in=block_ids[chunk:chunk + batch_size]).delete()
+            stats["rows"] += bulk_create_similarities(rows_for(start, neighbors, scores), batch_size)
+        stats["done"] += len(neighbors)
+        if progress is not None:
+            elapsed = time.perf_counter() - started
+            progress(stats["done"], n_rows, stats["done"] / elapsed if elapsed else 0.0)
+
+    if workers == 1:
+        _init_worker(matrix)
+        for start, end in blocks:
+            store(top_k_block(start, end, top_k))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix,)) as executor:
+            pending = set()
+            for start, end in blocks:
+                if len(pending) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        store(future.result())
+                pending.add(executor.submit(top_k_block, start, end, top_k))
+            for future in wait(pending).done:
+                store(future.result())
+
+    # Rows of movies that were left out of this index.
+    indexed = set(movie_ids.tolist())
+    stale = [movie_id for movie_id in MovieSimilarity.objects.values_list("movie_id", flat=True).distinct() if movie_id not in indexed]
+    for chunk in range(0, len(stale), batch_size):
+        MovieSimilarity.objects.filter(movie_id__in=stale[chunk:chunk + batch_size]).delete()
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["movies_per_second"] = n_rows / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
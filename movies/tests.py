@@ -1,3 +1,930 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import math
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import numpy as np
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient,
+    Client,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.urls import path, reverse
+from movie_recommendation.metrics import MetricsMiddleware, registry
+from movie_recommendation.query_budget import QueryBudgetMiddleware, assert_query_budget
+from movies import autocomplete, counters, recommendation, views
+from movies.cache import (
+    LocMemLRUBackend,
+    RecommendationCache,
+    bump_catalog_version,
+    get_catalog_version,
+    get_popularity_version,
+)
+from movies.ann import RandomHyperplaneLSH, recall_at_k
+from movies.embeddings import EmbeddingIndex, randomized_svd
+from movies.similarity_builder import build_similarity_table
+from movies.index_store import activate_version, current_index_version, list_versions, previous_version, store_index
+from movies.management.commands.import_movies import parse_row
+from movies.popularity import bump_daily_stats, refresh_popularity
+from movies.search import SearchIndex, analyze, invalidate_search_index, search_movies
+from movies.tokenizer import ENGLISH_STOP_WORDS, movie_tags, stop_words
+from movies.models import Genre, Language, Like, Movie, MovieSimilarity, MyList, UserTasteProfile, WatchHistory
+from movies.recommendation import (
+    TASTE_PROFILE_EPOCH,
+    TfidfIndex,
+    compute_idf,
+    compute_tfidf_vectors,
+    cosine_similarity,
+    get_index,
+    index_status,
+    invalidate_index,
+    load_stored_index,
+    rebuild_index,
+    rebuild_taste_profile,
+    record_watch,
+    rollback_index,
+    schedule_rebuild,
+)
 
-# Create your tests here.
+
+def make_movie(title, tags="", language=None, **fields):
+    if language is None:
+        language, _ = Language.objects.get_or_create(name="English")
+    fields.setdefault("description", title)
+    fields.setdefault("youtube_id", f"yt-{title}"[:20])
+    fields.setdefault("poster", "posters/test.jpg")
+    fields.setdefault("duration", 100)
+    return Movie.objects.create(title=title, tags=tags, language=language, **fields)
+
+
+def synthetic_documents(count, seed=0) -> list:
+    rng = random.Random(seed)
+    vocabulary = [f"term{number}" for number in range(40)]
+    return [rng.choices(vocabulary, k=rng.randint(3, 12)) for _ in range(count)]
+
+
+def positive(results) -> list:
+    """Drop zero-score filler, whose order depends only on row layout."""
+    return [(movie_id, score) for movie_id, score in results if score > 0]
+
+
+class TfidfIndexTests(TestCase):
+    def assertSameResults(self, first, second):
+        self.assertEqual([movie_id for movie_id, _ in first], [movie_id for movie_id, _ in second])
+        for (_, score), (_, expected) in zip(first, second):
+            self.assertAlmostEqual(score, expected, places=5)
+
+    def test_similar_matches_dense_cosine_similarity(self):
+        documents = synthetic_documents(30)
+        movie_ids = list(range(1, len(documents) + 1))
+        index = TfidfIndex(movie_ids, documents)
+
+        idf = compute_idf(documents)
+        vocabulary = sorted(idf)
+        vectors = compute_tfidf_vectors(documents, idf, vocabulary)
+        for row, movie_id in enumerate(movie_ids):
+            expected = sorted(
+                (
+                    (cosine_similarity(vectors[row], vectors[other], vocabulary), -other_id)
+                    for other, other_id in enumerate(movie_ids)
+                    if other != row
+                ),
+                reverse=True,
+            )[:5]
+            results = index.similar(movie_id, 5)
+            self.assertEqual(len(results), 5)
+            for (_, score), (expected_score, _) in zip(results, expected):
+                self.assertAlmostEqual(score, expected_score, places=5)
+
+    def test_incremental_changes_match_full_rebuild_after_reweight(self):
+        documents = synthetic_documents(40, seed=1)
+        movie_ids = list(range(1, len(documents) + 1))
+        index = TfidfIndex(movie_ids, documents)
+
+        changed = synthetic_documents(3, seed=2)
+        current = dict(zip(movie_ids, documents))
+        for movie_id, tokens in zip((3, 17, 41), changed):
+            index.upsert(movie_id, tokens)
+            current[movie_id] = tokens
+        for movie_id in (5, 28):
+            index.remove(movie_id)
+            del current[movie_id]
+        self.assertEqual(index.changes, 5)
+        index.reweight()
+
+        rebuilt = TfidfIndex(sorted(current), [current[movie_id] for movie_id in sorted(current)])
+        self.assertEqual(index.n_docs, rebuilt.n_docs)
+        for movie_id in current:
+            self.assertSameResults(positive(index.similar(movie_id, 8)), positive(rebuilt.similar(movie_id, 8)))
+        self.assertEqual(index.similar(5, 8), [])
+
+    def test_upsert_with_unchanged_tokens_is_a_no_op(self):
+        index = TfidfIndex([1, 2], [["space", "war"], ["space", "love"]])
+        self.assertFalse(index.upsert(1, ["war", "space"]))
+        self.assertEqual(index.changes, 0)
+
+
+class AnnTests(SimpleTestCase):
+    def setUp(self):
+        self.index = TfidfIndex(list(range(1, 301)), synthetic_documents(300, seed=8))
+
+    def test_lsh_recall_against_exact_search(self):
+        backend = RandomHyperplaneLSH(self.index, n_tables=8, n_bits=6, probes=2)
+        self.assertGreaterEqual(recall_at_k(self.index, backend, k=5, sample=100)["recall"], 0.85)
+
+    def test_candidate_shortfall_falls_back_to_exact_search(self):
+        backend = mock.Mock(n_rows=len(self.index))
+        backend.candidates.return_value = np.array([0, 1], dtype=np.int64)
+        for movie_id in (1, 50, 300):
+            with self.subTest(movie_id=movie_id):
+                self.assertEqual(
+                    self.index.similar(movie_id, 5, mode="ann", backend=backend),
+                    self.index.similar(movie_id, 5, mode="exact"),
+                )
+        backend.candidates.assert_called()
+
+
+class IndexStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(RECOMMENDATION_INDEX_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def assertSameIndex(self, loaded, expected):
+        self.assertEqual(loaded.n_docs, expected.n_docs)
+        for movie_id in expected.movie_id_to_row:
+            self.assertEqual(loaded.similar(movie_id, 8), expected.similar(movie_id, 8))
+        query = expected.terms_to_query({"term1": 1.0, "term5": 0.5})
+        self.assertEqual(loaded.recommend(*query, 8, exclude_ids=(1,)), expected.recommend(*query, 8, exclude_ids=(1,)))
+
+    def test_memory_mapped_round_trip_and_overlay(self):
+        documents = synthetic_documents(30, seed=7)
+        index = TfidfIndex(list(range(1, 31)), documents)
+        loaded = load_stored_index(store_index(index))
+        self.assertIsInstance(loaded.indices, np.memmap)
+        self.assertSameIndex(loaded, index)
+
+        # Upserts go to the overlay; the mapped base arrays are left shared.
+        for target in (index, loaded):
+            target.upsert(31, ["term1", "zebra"])
+            target.upsert(4, ["term5", "term1"])
+            target.remove(9)
+        self.assertIsInstance(loaded.indices, np.memmap)
+        self.assertSameIndex(loaded, index)
+        loaded.version = None
+        self.assertSameIndex(load_stored_index(store_index(loaded)), index)
+
+    def test_previous_version_and_activation_move_current(self):
+        index = TfidfIndex([1, 2], [["space", "war"], ["space", "love"]])
+        first = store_index(index)
+        index.version = None
+        second = store_index(index)
+        self.assertEqual(current_index_version(), second)
+        self.assertEqual(previous_version(second), first)
+        activate_version(first)
+        self.assertEqual(current_index_version(), first)
+        self.assertIsNone(previous_version(first))
+
+
+class EmbeddingIndexTests(SimpleTestCase):
+    def test_projection_survives_a_rebuild_that_shifts_term_columns(self):
+        documents = synthetic_documents(30, seed=3)
+        movie_ids = list(range(1, len(documents) + 1))
+        index = TfidfIndex(movie_ids, documents)
+        embeddings = EmbeddingIndex(movie_ids, randomized_svd(index, 8), index)
+        weights = {"term3": 1.0, "term17": 0.5, "term30": 0.25}
+        expected = embeddings.project(*index.terms_to_query(weights), index)
+
+        # "aardvark" sorts first, so every existing term moves one column on.
+        rebuilt = TfidfIndex(movie_ids + [31], documents + [["aardvark", "term3"]])
+        self.assertNotEqual(rebuilt.vocabulary["term3"], index.vocabulary["term3"])
+        projected = embeddings.project(*rebuilt.terms_to_query({**weights, "aardvark": 2.0}), rebuilt)
+        np.testing.assert_allclose(projected, expected, rtol=1e-5)
+
+        index.upsert(32, ["zebra", "term17"])
+        np.testing.assert_allclose(embeddings.project(*index.terms_to_query(weights), index), expected, rtol=1e-5)
+
+
+class SimilarityTableTests(TestCase):
+    def test_stored_neighbours_match_similar(self):
+        movies = [make_movie(f"Movie {number}", " ".join(tokens)) for number, tokens in enumerate(synthetic_documents(40, seed=9))]
+        # Identical tags tie on score; zero-score filler ties everywhere.
+        movies.append(make_movie("Twin", movies[0].tags))
+        index = TfidfIndex.from_movies()
+        stale = make_movie("Gone", "space")
+        MovieSimilarity.objects.create(movie=stale, neighbor=movies[0], score=1.0, rank=1)
+
+        # A small memory budget splits the table into several blocks.
+        stats = build_similarity_table(index, top_k=6, workers=1, memory_budget=4096)
+        self.assertGreater(stats["blocks"], 1)
+        self.assertFalse(MovieSimilarity.objects.filter(movie=stale).exists())
+        for movie in movies:
+            stored = list(MovieSimilarity.objects.filter(movie=movie).order_by("rank").values_list("neighbor_id", "score"))
+            expected = index.similar(movie.id, 6)
+            with self.subTest(movie=movie.title):
+                self.assertEqual([neighbor_id for neighbor_id, _ in stored], [neighbor_id for neighbor_id, _ in expected])
+                for (_, score), (_, expected_score) in zip(stored, expected):
+                    self.assertAlmostEqual(score, expected_score, places=5)
+
+
+# A high reweight threshold keeps catch-up from starting background
+# rebuilds, which would race the test transaction.
+@override_settings(RECOMMENDATION_INDEX_DIR=None, RECOMMENDATION_REWEIGHT_THRESHOLD=10)
+class IndexSyncTests(TestCase):
+    def setUp(self):
+        invalidate_index()
+        self.addCleanup(invalidate_index)
+
+    def test_saving_and_deleting_movies_updates_the_shared_index(self):
+        first = make_movie("Space War", "space war robot")
+        second = make_movie("Love Story", "love citi")
+        self.assertEqual(get_index().n_docs, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.tags = "space robot"
+            second.save()
+        self.assertEqual([movie_id for movie_id, _ in positive(get_index().similar(first.id, 5))], [second.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        index = get_index()
+        self.assertEqual(index.n_docs, 1)
+        self.assertNotIn(second.id, index.movie_id_to_row)
+
+
+@override_settings(RECOMMENDATION_INDEX_DIR=None, RECOMMENDATION_REWEIGHT_THRESHOLD=10, RECOMMENDATION_INDEX_KEEP_VERSIONS=2)
+class IndexLifecycleTests(TestCase):
+    def setUp(self):
+        make_movie("Space War", "space war robot")
+        make_movie("Love Story", "love citi")
+        invalidate_index()
+        self.addCleanup(invalidate_index)
+        for patcher in (mock.patch.object(recommendation, "_pinned", False), mock.patch.object(recommendation, "_previous_index", None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertRollbackIsPinned(self):
+        first = rebuild_index()
+        second = rebuild_index()
+        self.assertEqual(rollback_index().version, first.version)
+        self.assertTrue(index_status()["pinned"])
+
+        self.assertIsNone(rebuild_index(automatic=True))
+        with mock.patch("movies.recommendation.rebuild_index_in_background") as background:
+            schedule_rebuild()
+        background.assert_not_called()
+        self.assertEqual(get_index().version, first.version)
+        return second
+
+    def test_automatic_rebuilds_keep_an_in_memory_rollback(self):
+        self.assertRollbackIsPinned()
+        third = rebuild_index()
+        self.assertFalse(index_status()["pinned"])
+        self.assertEqual(get_index().version, third.version)
+
+    def test_stored_rebuilds_prune_versions_and_keep_a_pinned_rollback(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(RECOMMENDATION_INDEX_DIR=directory):
+            for _ in range(3):
+                rebuild_index()
+            self.assertEqual(len(list_versions()), 2)
+
+            second = self.assertRollbackIsPinned()
+            self.assertEqual(len(list_versions()), 2)
+            self.assertLess(current_index_version(), second.version)
+
+            third = rebuild_index()
+            self.assertFalse(index_status()["pinned"])
+            self.assertEqual(current_index_version(), third.version)
+            self.assertEqual(list_versions(), sorted([second.version, third.version]))
+
+
+@override_settings(RECOMMENDATION_INDEX_DIR=None, RECOMMENDATION_REWEIGHT_THRESHOLD=10, TASTE_PROFILE_HALF_LIFE_DAYS=0.01)
+class TasteProfileTests(TestCase):
+    def setUp(self):
+        invalidate_index()
+        self.addCleanup(invalidate_index)
+        self.user = User.objects.create_user("viewer")
+        self.old = make_movie("Space War", "space robot")
+        self.new = make_movie("Love Story", "love citi")
+
+    def watch(self, movie, days):
+        watch = WatchHistory.objects.create(user=self.user, movie=movie)
+        watched_at = TASTE_PROFILE_EPOCH + datetime.timedelta(days=days)
+        WatchHistory.objects.filter(pk=watch.pk).update(created_at=watched_at)
+        return watched_at
+
+    def test_events_thousands_of_half_lives_apart_stay_finite(self):
+        # 2 ** (days / 0.01) overflows a float after about ten days.
+        self.watch(self.old, 1)
+        self.watch(self.new, 400)
+        profile = rebuild_taste_profile(self.user)
+        self.assertEqual(set(profile.weights), {"love", "citi"})
+        self.assertGreater(profile.log2_scale, -40000)
+
+        record_watch(self.user, self.old.id, TASTE_PROFILE_EPOCH + datetime.timedelta(days=800))
+        profile.refresh_from_db()
+        self.assertEqual(set(profile.weights), {"space", "robot"})
+        self.assertTrue(all(0 < value <= 1e12 for value in profile.weights.values()))
+
+    def test_incremental_updates_match_a_rebuild(self):
+        self.watch(self.old, 3)
+        rebuild_taste_profile(self.user)
+        record_watch(self.user, self.new.id, self.watch(self.new, 3.05))
+        incremental = UserTasteProfile.objects.get(user=self.user)
+
+        rebuilt = rebuild_taste_profile(self.user)
+        self.assertEqual(incremental.watched_movies, rebuilt.watched_movies)
+        self.assertEqual(set(incremental.weights), set(rebuilt.weights))
+        for term, value in rebuilt.weights.items():
+            expected = value * 2 ** rebuilt.log2_scale
+            self.assertAlmostEqual(incremental.weights[term] * 2 ** incremental.log2_scale, expected, delta=expected * 1e-9)
+
+
+class RetagMoviesTests(TestCase):
+    def retag(self, workers) -> str:
+        stdout = io.StringIO()
+        call_command("retag_movies", workers=workers, chunk_size=2, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_matches_the_admin_tags_and_is_idempotent(self):
+        action = Genre.objects.create(name="Action")
+        drama = Genre.objects.create(name="Drama")
+        french, _ = Language.objects.get_or_create(name="French")
+        movies = [
+            make_movie("Robots", "stale", description="The robots are running through the burning cities."),
+            make_movie("Quiet", "stale", language=french, description="A quiet story about loving and losing."),
+            make_movie("Empty", "", description=""),
+        ]
+        movies[0].genres.add(action, drama)
+        movies[1].genres.add(drama)
+
+        self.assertIn("Retagged 3 of 3 movies", self.retag(workers=2))
+        for movie in movies:
+            movie.refresh_from_db()
+            with self.subTest(movie=movie.title):
+                self.assertEqual(movie.tags, movie_tags(movie))
+
+        updated_at = {movie.pk: movie.updated_at for movie in movies}
+        self.assertIn("Retagged 0 of 3 movies", self.retag(workers=1))
+        self.assertEqual(dict(Movie.objects.values_list("pk", "updated_at")), updated_at)
+
+
+class ImportRowTests(SimpleTestCase):
+    row = {
+        "title": "Space War", "description": "robots", "youtube_id": "abc123", "poster": "posters/a.jpg",
+        "duration": "100", "language": "English", "genres": "Action|Drama",
+    }
+
+    def test_valid_row(self):
+        record = parse_row(self.row, "|", 20, 20)
+        self.assertEqual(record["genres"], ["Action", "Drama"])
+        self.assertEqual(record["duration"], 100)
+
+    def test_rows_longer_than_the_columns_are_rejected(self):
+        for field, length in (("title", 256), ("youtube_id", 21), ("poster", 101)):
+            with self.subTest(field=field), self.assertRaisesMessage(ValueError, f"too long: {field}"):
+                parse_row({**self.row, field: "x" * length}, "|", 20, 20)
+
+
+@override_settings(MOVIE_COUNTER_SHARDS=4, MOVIE_COUNTER_ROLLUP_SECONDS=10**9)
+class CounterTests(TestCase):
+    def setUp(self):
+        self.movie = make_movie("Space War")
+
+    def test_every_increment_checks_whether_a_rollup_is_due(self):
+        with mock.patch("movies.counters.rollup_counters_if_due") as rollup_if_due:
+            for _ in range(20):
+                counters.add_to_counters(self.movie.id, views=1)
+        # Most of these updated an existing shard rather than creating one.
+        self.assertLessEqual(self.movie.counter_shards.count(), 4)
+        self.assertEqual(rollup_if_due.call_count, 20)
+
+    def test_exact_counts_include_pending_shards_until_rolled_up(self):
+        for _ in range(10):
+            counters.add_to_counters(self.movie.id, views=1, likes=1)
+        counters.add_to_counters(self.movie.id, likes=-3)
+        self.assertEqual(counters.get_movie_counters(self.movie.id, exact=False), (0, 0))
+        self.assertEqual(counters.get_movie_counters(self.movie.id), (10, 7))
+
+        self.assertGreater(counters.rollup_counters(), 0)
+        self.assertFalse(self.movie.counter_shards.exists())
+        self.assertEqual(counters.get_movie_counters(self.movie.id, exact=False), (10, 7))
+        self.assertEqual(counters.get_movie_counters(self.movie.id), (10, 7))
+
+
+class InteractionUrls:
+    urlpatterns = [
+        path("like/", views.LikeMovie.as_view()),
+        path("my-list/", views.ToggleMyListView.as_view()),
+        path("async/like/", views.AsyncLikeMovie.as_view()),
+        path("async/my-list/", views.AsyncToggleMyListView.as_view()),
+    ]
+
+
+@override_settings(
+    ROOT_URLCONF=InteractionUrls,
+    RECOMMENDATION_INDEX_DIR=None,
+    RECOMMENDATION_REWEIGHT_THRESHOLD=10,
+    MOVIE_COUNTER_SHARDS=4,
+    MOVIE_COUNTER_ROLLUP_SECONDS=10**9,
+    POPULARITY_REFRESH_SECONDS=10**9,
+)
+class ConcurrentInteractionTests(TransactionTestCase):
+    """Many users hit the same movie at once; every request must land."""
+
+    users = 12
+
+    def setUp(self):
+        invalidate_index()
+        self.addCleanup(invalidate_index)
+        self.movie = make_movie("Space War", "space robot")
+        self.viewers = [User.objects.create_user(f"viewer-{number}") for number in range(self.users)]
+        WatchHistory.objects.bulk_create([WatchHistory(user=user, movie=self.movie) for user in self.viewers])
+        for user in self.viewers:
+            rebuild_taste_profile(user)
+        self.body = json.dumps({"id": self.movie.id})
+
+    def assert_all_landed(self, statuses, liked):
+        self.assertEqual(statuses, [200] * self.users)
+        self.assertEqual(Like.objects.filter(movie=self.movie).count(), self.users if liked else 0)
+        self.assertEqual(counters.get_movie_counters(self.movie.id), (0, self.users if liked else 0))
+        for profile in UserTasteProfile.objects.filter(user__in=self.viewers):
+            self.assertEqual(set(profile.weights), {"space", "robot"})
+
+    @skipUnlessDBFeature("test_db_allows_multiple_connections")
+    def test_sync_views_from_worker_threads(self):
+        def post(user, url):
+            client = Client()
+            client.force_login(user)
+            try:
+                return client.post(url, self.body, content_type="application/json").status_code
+            finally:
+                connections.close_all()
+
+        def post_all(url):
+            with ThreadPoolExecutor(4) as executor:
+                return list(executor.map(post, self.viewers, [url] * self.users))
+
+        self.assert_all_landed(post_all("/like/"), liked=True)
+        self.assert_all_landed(post_all("/like/"), liked=False)
+        self.assertEqual(post_all("/my-list/"), [200] * self.users)
+        self.assertEqual(MyList.objects.filter(movie=self.movie).count(), self.users)
+
+    async def test_async_views_on_one_event_loop(self):
+        clients = []
+        for user in self.viewers:
+            client = AsyncClient()
+            await client.aforce_login(user)
+            clients.append(client)
+
+        async def post_all(url):
+            responses = await asyncio.gather(
+                *(client.post(url, self.body, content_type="application/json") for client in clients)
+            )
+            return [response.status_code for response in responses]
+
+        statuses = await post_all("/async/like/")
+        await sync_to_async(self.assert_all_landed)(statuses, liked=True)
+        statuses = await post_all("/async/like/")
+        await sync_to_async(self.assert_all_landed)(statuses, liked=False)
+        self.assertEqual(await post_all("/async/my-list/"), [200] * self.users)
+        self.assertEqual(await MyList.objects.filter(movie=self.movie).acount(), self.users)
+
+
+@override_settings(
+    RECOMMENDATION_INDEX_DIR=None,
+    RECOMMENDATION_REWEIGHT_THRESHOLD=10,
+    MOVIE_COUNTER_ROLLUP_SECONDS=10**9,
+    POPULARITY_REFRESH_SECONDS=10**9,
+)
+class QueryBudgetTests(TestCase):
+    """Page queries must not grow with the number of rows listed."""
+
+    def setUp(self):
+        invalidate_index()
+        self.addCleanup(invalidate_index)
+        self.user = User.objects.create_user("viewer")
+        self.client.force_login(self.user)
+        self.genres = [Genre.objects.create(name=f"Genre {number}") for number in range(12)]
+        self.movies = []
+        for number in range(12):
+            movie = make_movie(f"Movie {number}", f"tag{number} shared")
+            movie.genres.set(self.genres[:number + 1])
+            self.movies.append(movie)
+
+    def queries(self, url) -> int:
+        with assert_query_budget(max_queries=15, max_repeats=1) as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return recorder.count
+
+    def grow(self, model, count):
+        model.objects.bulk_create([model(user=self.user, movie=movie) for movie in self.movies[:count]])
+
+    def test_my_list(self):
+        self.grow(MyList, 2)
+        few = self.queries(reverse("my_list"))
+        MyList.objects.all().delete()
+        self.grow(MyList, 12)
+        self.assertEqual(self.queries(reverse("my_list")), few)
+
+    def test_watch_history(self):
+        self.grow(WatchHistory, 2)
+        few = self.queries(reverse("watch_history"))
+        WatchHistory.objects.all().delete()
+        self.grow(WatchHistory, 12)
+        self.assertEqual(self.queries(reverse("watch_history")), few)
+
+    def test_genre_list(self):
+        few = self.queries(reverse("movie_genre_list"))
+        for number in range(12):
+            Genre.objects.create(name=f"More {number}").movies.set(self.movies)
+        self.assertEqual(self.queries(reverse("movie_genre_list")), few)
+
+    def test_watch_page(self):
+        movie = self.movies[0]
+        get_index()
+        few = self.queries(reverse("watch", args=[movie.id]))
+        self.grow(WatchHistory, 12)
+        self.grow(Like, 12)
+        self.grow(MyList, 12)
+        self.assertEqual(self.queries(reverse("watch", args=[movie.id])), few)
+
+
+@override_settings(
+    ROOT_URLCONF=InteractionUrls,
+    METRICS={"ENABLED": True},
+    QUERY_BUDGET={"ENABLED": True, "MAX_QUERIES": 100},
+    RECOMMENDATION_INDEX_DIR=None,
+    RECOMMENDATION_REWEIGHT_THRESHOLD=10,
+    MOVIE_COUNTER_ROLLUP_SECONDS=10**9,
+)
+class RequestMiddlewareTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.user = User.objects.create_user("viewer")
+        self.movie = make_movie("Space War")
+        self.body = json.dumps({"id": self.movie.id})
+
+    def assert_recorded(self, response, route):
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        labels = (("view", route),)
+        self.assertGreater(registry.metrics["movie_recommendation_http_db_queries_total"].series[labels], 0)
+        self.assertEqual(registry.metrics["movie_recommendation_http_request_duration_seconds"].series[labels][2], 1)
+
+    def test_sync_view(self):
+        self.client.force_login(self.user)
+        response = self.client.post("/my-list/", self.body, content_type="application/json")
+        self.assert_recorded(response, "my-list/")
+
+    async def test_async_view(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post("/async/my-list/", self.body, content_type="application/json")
+        self.assert_recorded(response, "async/my-list/")
+
+    def test_async_stack_needs_no_sync_adapter(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        for middleware in (MetricsMiddleware, QueryBudgetMiddleware):
+            with self.subTest(middleware=middleware.__name__):
+                self.assertTrue(iscoroutinefunction(middleware(get_response)))
+                self.assertFalse(iscoroutinefunction(middleware(lambda request: HttpResponse())))
+
+
+class RecommendationCacheTests(SimpleTestCase):
+    def test_evicted_version_counters_never_resurrect_old_entries(self):
+        cache = RecommendationCache(LocMemLRUBackend(max_entries=3))
+        cache.set("for_you", 1, 7, value=["stale"])
+        cache.bump_user(1)
+        for user_id in range(2, 10):
+            cache.bump_user(user_id)
+        self.assertEqual(len(cache.backend._versions), 3)
+        self.assertIsNone(cache.get("for_you", 1, 7))
+
+    def test_stats_are_exported_as_metrics(self):
+        cache = RecommendationCache(LocMemLRUBackend())
+        cache.set("for_you", 1, 7, value=["movie"])
+        cache.get("for_you", 1, 7)
+        cache.get("for_you", 2, 7)
+        with mock.patch("movies.cache._recommendation_cache", cache):
+            rendered = registry.render()
+        self.assertIn('movie_recommendation_cache_hits_total{backend="LocMemLRUBackend"} 1', rendered)
+        self.assertIn('movie_recommendation_cache_misses_total{backend="LocMemLRUBackend"} 1', rendered)
+        self.assertIn('movie_recommendation_cache_evictions_total{backend="LocMemLRUBackend"} 0', rendered)
+
+
+@override_settings(
+    RECOMMENDATION_INDEX_DIR=None,
+    RECOMMENDATION_REWEIGHT_THRESHOLD=10,
+    POPULARITY_REFRESH_SECONDS=10**9,
+)
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        invalidate_index()
+        self.addCleanup(invalidate_index)
+        for alias in ("default", "template_fragments"):
+            caches[alias].clear()
+            self.addCleanup(caches[alias].clear)
+        self.movie = make_movie("Space War")
+
+    def test_versions_survive_a_fresh_cache(self):
+        version = get_catalog_version()
+        bump_catalog_version()
+        # As seen by another worker, whose caches never heard of the bump.
+        caches["default"].clear()
+        self.assertEqual(get_catalog_version(), version + 1)
+
+    def test_a_bump_rerenders_cached_movie_cards(self):
+        self.assertContains(self.client.get("/"), "Space War")
+        # Like a management command in another process: no signals here.
+        Movie.objects.filter(pk=self.movie.pk).update(title="Star War")
+        self.assertContains(self.client.get("/"), "Space War")
+        bump_catalog_version()
+        self.assertContains(self.client.get("/"), "Star War")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.title = "Moon War"
+            self.movie.save()
+        self.assertContains(self.client.get("/"), "Moon War")
+
+    def test_popularity_refresh_bumps_only_when_the_order_changes(self):
+        other = make_movie("Love Story")
+        bump_daily_stats(self.movie.id, likes=5, views=5)
+        bump_daily_stats(other.id, likes=1, views=5)
+        catalog_version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_popularity()
+        version = get_popularity_version()
+        self.assertGreater(version, 0)
+
+        bump_daily_stats(self.movie.id, views=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_popularity()
+        self.assertEqual(get_popularity_version(), version)
+
+        bump_daily_stats(other.id, likes=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_popularity()
+        self.assertEqual(get_popularity_version(), version + 1)
+        self.assertEqual(get_catalog_version(), catalog_version)
+
+
+@override_settings(
+    RECOMMENDATION_INDEX_DIR=None,
+    RECOMMENDATION_REWEIGHT_THRESHOLD=10,
+    POPULARITY_REFRESH_SECONDS=10**9,
+    CONDITIONAL_GET=True,
+)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        invalidate_index()
+        self.addCleanup(invalidate_index)
+        for alias in ("default", "template_fragments"):
+            caches[alias].clear()
+            self.addCleanup(caches[alias].clear)
+        self.movie = make_movie("Space War")
+        self.movie.genres.add(Genre.objects.create(name="Action"))
+        bump_catalog_version()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={"if-none-match": response["ETag"]})
+
+    def fresh_worker(self):
+        """Forget everything this process holds, as another worker would."""
+        for alias in ("default", "template_fragments"):
+            caches[alias].clear()
+        autocomplete._autocomplete_index = None
+
+    def test_unchanged_pages_answer_304_on_every_worker(self):
+        for url in ("/", reverse("movie_genre_list"), reverse("new_releases"), reverse("autocomplete") + "?q=spa"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("no-cache", response["Cache-Control"])
+                self.fresh_worker()
+                self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+    def test_a_bump_from_another_process_changes_the_etag(self):
+        url = reverse("movie_genre_list")
+        response = self.client.get(url)
+        self.assertIn("Last-Modified", response)
+        # An import or retag run elsewhere: the database row is all it leaves.
+        bump_catalog_version()
+        self.fresh_worker()
+        changed = self.revalidate(url, response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], response["ETag"])
+
+    def test_popularity_reorder_changes_the_home_page_only(self):
+        home = self.client.get("/")
+        genres = self.client.get(reverse("movie_genre_list"))
+        bump_daily_stats(self.movie.id, likes=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_popularity()
+        self.assertEqual(self.revalidate("/", home).status_code, 200)
+        self.assertEqual(self.revalidate(reverse("movie_genre_list"), genres).status_code, 304)
+
+    def test_home_etag_follows_the_viewers_taste_profile(self):
+        user = User.objects.create_user("viewer")
+        self.client.force_login(user)
+        # The first visit creates the (empty) profile while rendering.
+        self.client.get("/")
+        response = self.client.get("/")
+        self.assertNotIn("Last-Modified", response)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertEqual(self.revalidate("/", response).status_code, 304)
+
+        WatchHistory.objects.create(user=user, movie=self.movie)
+        rebuild_taste_profile(user)
+        self.assertEqual(self.revalidate("/", response).status_code, 200)
+
+    def test_autocomplete_etag_follows_the_suggestions(self):
+        url = reverse("autocomplete") + "?q=spa"
+        response = self.client.get(url)
+        Movie.objects.filter(pk=self.movie.pk).update(title="Spade War")
+        self.fresh_worker()
+        changed = self.revalidate(url, response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertContains(changed, "Spade War")
+
+
+class AutocompleteIndexTests(SimpleTestCase):
+    def build(self, *labels_and_views) -> autocomplete.AutocompleteIndex:
+        return autocomplete.AutocompleteIndex(
+            [{"type": "movie", "label": label, "url": f"/{label}", "views": views} for label, views in labels_and_views],
+            limit=3,
+            cached_prefix_length=2,
+        )
+
+    def labels(self, index, query, limit=None) -> list:
+        return [suggestion["label"] for suggestion in index.lookup(query, limit)]
+
+    def test_matches_prefixes_of_each_word_only(self):
+        index = self.build(("The Dark Knight", 5), ("Knight and Day", 1))
+        self.assertEqual(self.labels(index, "knight"), ["The Dark Knight", "Knight and Day"])
+        self.assertEqual(self.labels(index, "dark kn"), ["The Dark Knight"])
+        self.assertEqual(self.labels(index, "night"), [])
+        self.assertEqual(self.labels(index, "  "), [])
+
+    def test_folds_case_and_accents(self):
+        index = self.build(("Amélie", 1), ("Crouching Tiger, Hidden Dragon", 1))
+        for query in ("ame", "AMÉ", "Amelie"):
+            with self.subTest(query=query):
+                self.assertEqual(self.labels(index, query), ["Amélie"])
+        self.assertEqual(self.labels(index, "tiger hidden"), ["Crouching Tiger, Hidden Dragon"])
+
+    def test_ranks_by_views_and_caps_the_limit(self):
+        index = self.build(("Star Trek", 10), ("Star Wars", 30), ("Stardust", 20), ("Starman", 5))
+        for query in ("s", "sta", "star"):
+            with self.subTest(query=query):
+                self.assertEqual(self.labels(index, query), ["Star Wars", "Stardust", "Star Trek"])
+        self.assertEqual(self.labels(index, "star", 1), ["Star Wars"])
+        self.assertEqual(len(index.lookup("star", 50)), 3)
+        self.assertEqual(index.lookup("star", 0), [])
+        self.assertEqual(index.lookup("star", -1), [])
+
+
+@override_settings(
+    RECOMMENDATION_INDEX_DIR=None,
+    RECOMMENDATION_REWEIGHT_THRESHOLD=10,
+    AUTOCOMPLETE={"CHECK_SECONDS": 0, "REFRESH_SECONDS": 300, "OPTIONS": {"limit": 10, "cached_prefix_length": 2}},
+)
+class AutocompleteViewTests(TestCase):
+    def setUp(self):
+        autocomplete._autocomplete_index = None
+        self.addCleanup(setattr, autocomplete, "_autocomplete_index", None)
+        self.url = reverse("autocomplete")
+
+    def labels(self, **params) -> list:
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [suggestion["label"] for suggestion in response.json()["results"]]
+
+    def test_rejects_limits_below_one(self):
+        make_movie("Space War")
+        for limit in ("0", "-1", "many"):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.client.get(self.url, {"q": "spa", "limit": limit}).status_code, 400)
+        self.assertEqual(self.labels(q="spa", limit=1), ["Space War"])
+
+    def test_rebuilds_when_the_catalog_signature_changes(self):
+        movie = make_movie("Space War")
+        self.assertEqual(self.labels(q="spa"), ["Space War"])
+        make_movie("Spaceballs", total_views=50)
+        self.assertEqual(self.labels(q="spa"), ["Spaceballs", "Space War"])
+        movie.delete()
+        self.assertEqual(self.labels(q="spa"), ["Spaceballs"])
+
+
+def reference_bm25(documents, query, k1=1.2, b=0.75) -> list:
+    """Textbook BM25 over {movie_id: [terms]}, ranked best first."""
+    average_length = sum(len(terms) for terms in documents.values()) / len(documents)
+    scores = {}
+    for term in set(query):
+        matching = [movie_id for movie_id, terms in documents.items() if term in terms]
+        idf = math.log(1 + (len(documents) - len(matching) + 0.5) / (len(matching) + 0.5))
+        for movie_id in matching:
+            frequency = documents[movie_id].count(term)
+            norm = k1 * (1 - b + b * len(documents[movie_id]) / average_length)
+            scores[movie_id] = scores.get(movie_id, 0) + idf * frequency * (k1 + 1) / (frequency + norm)
+    return sorted(scores, key=lambda movie_id: (-round(scores[movie_id], 4), movie_id))
+
+
+class SearchIndexTests(SimpleTestCase):
+    def build(self, documents) -> SearchIndex:
+        index = SearchIndex()
+        for movie_id, terms in documents.items():
+            index.upsert(movie_id, "", "", " ".join(terms))
+        return index
+
+    def test_ranking_matches_reference_bm25(self):
+        documents = dict(enumerate(synthetic_documents(60, seed=3), start=1))
+        index = self.build(documents)
+        rng = random.Random(4)
+        for _ in range(20):
+            query = rng.sample([f"term{number}" for number in range(40)], rng.randint(1, 3))
+            with self.subTest(query=query):
+                self.assertEqual(index.search(" ".join(query)), reference_bm25(documents, query))
+
+    def test_incremental_updates_match_a_fresh_build(self):
+        documents = dict(enumerate(synthetic_documents(40, seed=5), start=1))
+        index = self.build(documents)
+        rng = random.Random(6)
+        for movie_id in rng.sample(sorted(documents), 10):
+            documents[movie_id] = rng.choices([f"term{number}" for number in range(40)], k=rng.randint(3, 12))
+            index.upsert(movie_id, "", "", " ".join(documents[movie_id]))
+        for movie_id in rng.sample(sorted(documents), 5):
+            del documents[movie_id]
+            self.assertTrue(index.remove(movie_id))
+        documents[100] = ["term1", "term2"]
+        index.upsert(100, "", "", "term1 term2")
+
+        fresh = self.build(documents)
+        for number in range(40):
+            with self.subTest(term=number):
+                self.assertEqual(index.search(f"term{number}"), fresh.search(f"term{number}"))
+
+    def test_analyzer_works_without_the_nltk_corpus(self):
+        stop_words.cache_clear()
+        self.addCleanup(stop_words.cache_clear)
+        with mock.patch("movies.tokenizer.stopwords.words", side_effect=LookupError), self.assertLogs("movies.tokenizer", "WARNING"):
+            self.assertEqual(stop_words(), ENGLISH_STOP_WORDS)
+            self.assertEqual(analyze("The robots are running"), ["robot", "run"])
+
+    def test_title_matches_outrank_description_matches(self):
+        index = SearchIndex()
+        index.upsert(1, "Quiet Harbor", "A drama about a robot.", "")
+        index.upsert(2, "Robot Uprising", "A drama about a harbor.", "")
+        self.assertEqual(index.search("robot"), [2, 1])
+        self.assertEqual(index.search("harbor"), [1, 2])
+        self.assertEqual(index.search("submarine"), [])
+
+
+@override_settings(RECOMMENDATION_INDEX_DIR=None, RECOMMENDATION_REWEIGHT_THRESHOLD=10)
+class MovieSearchTests(TestCase):
+    def setUp(self):
+        invalidate_search_index()
+        self.addCleanup(invalidate_search_index)
+
+    def test_search_follows_catalog_changes(self):
+        robots = make_movie("Robot Uprising", description="robots take over")
+        make_movie("Quiet Harbor", description="a harbor drama with one robot")
+        self.assertEqual(search_movies("robot")[0], robots.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            robots.title = "Sunset Boulevard"
+            robots.description = "a faded star"
+            robots.save()
+        self.assertNotIn(robots.id, search_movies("robot"))
+        self.assertEqual(search_movies("sunset"), [robots.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            robots.delete()
+        self.assertEqual(search_movies("sunset"), [])
+
+    def test_search_page_lists_results_in_rank_order(self):
+        first = make_movie("Robot Uprising", description="robots")
+        second = make_movie("Quiet Harbor", description="one robot")
+        make_movie("Love Story", description="romance")
+        response = self.client.get(reverse("movies"), {"search": "robot"})
+        self.assertEqual([movie.id for movie in response.context["movie_list"]], [first.id, second.id])
@@ -0,0 +1,50 @@
+import functools
+import logging
+from nltk.corpus import stopwords
+from nltk.stem import PorterStemmer
+
+STEM_CACHE_SIZE = 100000
+
+# NLTK's English stopword list, used when its corpus is not installed so
+# tags and search terms come out the same either way.
+ENGLISH_STOP_WORDS = frozenset("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself yourselves he him his
+himself she she's her hers herself it it's its itself they them their theirs themselves what which who whom this
+that that'll these those am is are was were be been being have has had having do does did doing a an the and but
+if or because as until while of at by for with about against between into through during before after above below
+to from up down in out on off over under again further then once here there when where why how all any both each
+few more most other some such no nor not only own same so than too very s t can will just don don't should
+should've now d ll m o re ve y ain aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn hasn't
+haven haven't isn isn't ma mightn mightn't mustn mustn't needn needn't shan shan't shouldn shouldn't wasn wasn't
+weren weren't won won't wouldn wouldn't
+""".split())
+
+logger = logging.getLogger(__name__)
+
+_stemmer = PorterStemmer()
+
+
+@functools.cache
+def stop_words() -> frozenset:
+    try:
+        return frozenset(stopwords.words("english"))
+    except LookupError:
+        logger.warning("NLTK stopwords corpus not found; using the built-in English list.")
+        return ENGLISH_STOP_WORDS
+
+
+@functools.lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word) -> str:
+    return _stemmer.stem(word)
+
+
+def generate_tags(description, genre_names, language) -> str:
+    """Lower-case, drop English stopwords and Porter-stem the description,
+    genre names and language into the space-separated ``Movie.tags`` text."""
+    text = f"{description} {' '.join(genre_names)} {language}"
+    excluded = stop_words()
+    return " ".join(stem(word) for word in text.lower().split() if word not in excluded)
+
+
+def movie_tags(movie) -> str:
+    return generate_tags(movie.description, [genre.name for genre in movie.genres.all()], movie.language)
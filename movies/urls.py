@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if getattr(settings, "ASYNC_INTERACTION_VIEWS", False):
+    LikeMovie, UpdateHistory, ToggleMyListView = views.AsyncLikeMovie, views.AsyncUpdateHistory, views.AsyncToggleMyListView
+else:
+    LikeMovie, UpdateHistory, ToggleMyListView = views.LikeMovie, views.UpdateHistory, views.ToggleMyListView
+
 urlpatterns = [
     path("watch/<int:pk>/", views.WatchView.as_view(), name="watch"),
     path("popular/", views.PopularMoviesView.as_view(), name="popular_movies"),
@@ -10,7 +16,9 @@ urlpatterns = [
     path("my-list/", views.MyListMovieListView.as_view(), name="my_list"),
     path("watch-history/", views.WatchHistoryMovieListView.as_view(), name="watch_history"),
     path("", views.MovieListView.as_view(), name="movies"),
-    path("like/", views.LikeMovie.as_view(), name="like"),
-    path("update-history/", views.UpdateHistory.as_view(), name="update_history"),
-    path("add-to-my-list/", views.ToggleMyListView.as_view(), name="toggle_my_list"),
+    path("autocomplete/", views.AutocompleteView.as_view(), name="autocomplete"),
+    path("like/", LikeMovie.as_view(), name="like"),
+    path("update-history/", UpdateHistory.as_view(), name="update_history"),
+    path("add-to-my-list/", ToggleMyListView.as_view(), name="toggle_my_list"),
+    path("recommendation-index/", views.RecommendationIndexStatusView.as_view(), name="recommendation_index_status"),
 ]
\ No newline at end of file
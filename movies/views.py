@@ -1,29 +1,41 @@
 from django.shortcuts import render, redirect
 from django.views import generic, View
-from movies.models import Movie, Genre, MyList, WatchHistory, Like, View as ViewModel
-from django.contrib.auth.mixins import LoginRequiredMixin
+from movies.models import Movie, Genre, MyList, WatchHistory, Like
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.http import JsonResponse
 import json
-from datetime import timedelta
-from django.utils import timezone
-from django.db.models import F, Count, Q, FloatField, ExpressionWrapper
-import re
-from movies.recommendation import get_similar_recommendation
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef
+from django.utils.decorators import method_decorator
+from movies.recommendation import get_stored_similar_recommendation, record_like, index_status
+from movies.search import RankedMovies, search_movies
+from movies.autocomplete import get_autocomplete_index
+from movies.popularity import get_popular_movies
+from movies.events import ingest_watch_event
+from movies.counters import get_movie_counters
+from movies.conditional import autocomplete_etag, catalog_etag, catalog_last_modified, revalidate
+import time
 
 class WatchView(LoginRequiredMixin, generic.DetailView):
     model = Movie
     template_name = "movies/watch.html"
 
+    def get_queryset(self):
+        user = self.request.user
+        return super().get_queryset().annotate(
+            liked=Exists(Like.objects.filter(user=user, movie=OuterRef("pk"))),
+            in_my_list=Exists(MyList.objects.filter(user=user, movie=OuterRef("pk"))),
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["similar_movies"] = get_similar_recommendation(context["movie"].title, num_recommendations=7)
+        context["similar_movies"] = get_stored_similar_recommendation(context["movie"], num_recommendations=7)
+        context["movie"].total_views, context["movie"].total_likes = get_movie_counters(context["movie"].id)
 
-        context["like"] = False
-        context["my_list"] = False
-        if Like.objects.filter(user=self.request.user, movie=context["movie"]):
-            context['like']=True
-        if MyList.objects.filter(user=self.request.user, movie=context["movie"]):
-            context['my_list']=True
+        context["like"] = context["movie"].liked
+        context["my_list"] = context["movie"].in_my_list
 
         return context
 
@@ -32,35 +44,20 @@ class PopularMoviesView(generic.ListView):
     template_name = "movies/movie_list.html"
 
     def get_queryset(self):
-        last_7_days = timezone.now() - timedelta(days=7)
-
-        qs = Movie.objects.prefetch_related("genres", "language").annotate(
-            recent_likes=Count("likes", filter=Q(likes__created_at__gte=last_7_days)),
-            recent_views=Count("views", filter=Q(views__created_at__gte=last_7_days))
-        ).annotate(
-            popularity=ExpressionWrapper(
-                F("recent_likes") / (F("recent_views") + 1.0),
-                output_field=FloatField()
-            )
-        )
-        qs = qs.filter(popularity__gt=0).order_by("-popularity", "-recent_likes", "-recent_views", "-pk")
-        return qs
+        return get_popular_movies(Movie.objects.prefetch_related("genres", "language"))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["title"] = "Popular Movies"
         return context
 
+@method_decorator(revalidate(catalog_etag, catalog_last_modified), name="get")
 class MovieGenreView(generic.ListView):
     model = Genre
-    queryset = Genre.objects.all().order_by("name")
+    queryset = Genre.objects.annotate(movie_count=Count("movies")).filter(movie_count__gt=0).order_by("name")
     template_name = "movies/movie_genre_list.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["genre_list"] = [movie for movie in context["genre_list"] if movie.total_movies > 0]
-        return context
-
+@method_decorator(revalidate(catalog_etag, catalog_last_modified), name="get")
 class MovieByGenreView(generic.ListView):
     model = Movie
     template_name = "movies/movie_list.html"
@@ -74,6 +71,7 @@ class MovieByGenreView(generic.ListView):
         context["title"] = f"{self.genre.name} Movies"
         return context
 
+@method_decorator(revalidate(catalog_etag, catalog_last_modified), name="get")
 class NewMovieListView(generic.ListView):
     model = Movie
     template_name = "movies/movie_list.html"
@@ -93,7 +91,7 @@ class MyListMovieListView(LoginRequiredMixin, generic.ListView):
 
     def get_queryset(self):
         qs =  super().get_queryset()
-        qs = qs.filter(user=self.request.user).order_by("-created_at")
+        qs = qs.filter(user=self.request.user).select_related("movie").order_by("-created_at")
         return qs
 
     def get_context_data(self, **kwargs):
@@ -108,7 +106,7 @@ class WatchHistoryMovieListView(LoginRequiredMixin, generic.ListView):
     
     def get_queryset(self):
         qs =  super().get_queryset()
-        qs = qs.filter(user=self.request.user).order_by("-created_at")
+        qs = qs.filter(user=self.request.user).select_related("movie").order_by("-created_at")
         return qs
 
     def get_context_data(self, **kwargs):
@@ -120,25 +118,16 @@ class WatchHistoryMovieListView(LoginRequiredMixin, generic.ListView):
 class MovieListView(generic.ListView):
     model = Movie
     template_name = "movies/movie_list.html"
+    context_object_name = "movie_list"
+    paginate_by = getattr(settings, "MOVIE_SEARCH_PAGE_SIZE", 28)
 
     def get_queryset(self):
         self.q = self.request.GET.get("search", "").strip()
         qs = super().get_queryset()
         qs = qs.prefetch_related("language", "genres")
         if self.q:
-            # Tokenize and normalize the query
-            tokens = re.findall(r'\w+', self.q.lower())
-            
-            # Build the search query
-            search_filter = Q()
-            for token in tokens:
-                search_filter |= (
-                    Q(title__icontains=token) |
-                    Q(language__name__icontains=token) | 
-                    Q(genres__name__icontains=token)
-                )
-            return qs.filter(search_filter).distinct()
-        return qs
+            return RankedMovies(search_movies(self.q), qs)
+        return qs.order_by("-pk")
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -166,10 +155,11 @@ class LikeMovie(View):
             if history:
                 like, created = Like.objects.get_or_create(user=user, movie=movie)
                 if not created:
-                    Movie.objects.filter(pk=like.movie.id).update(total_likes=F('total_likes') - 1)
                     like.delete()
+                    record_like(user, movie.id, like.created_at, liked=False)
                     return JsonResponse({"status": False, "id": id})
                 else:
+                    record_like(user, movie.id, like.created_at)
                     return JsonResponse({"status": True, "id": id})
             else:
                 return JsonResponse({"error": "Movie has not been watched."}, status=400)
@@ -188,20 +178,9 @@ class UpdateHistory(View):
             print(id)
             if not isinstance(id, int):
                 return JsonResponse({"error": "Invalid id"}, status=400)
-            try:
-                movie = Movie.objects.get(pk=id)
-            except Movie.DoesNotExist:
+            if not Movie.objects.filter(pk=id).exists():
                 return JsonResponse({"error": "Movie not found"}, status=404)
-            ip = request.META.get("REMOTE_ADDR")
-            watch = WatchHistory.objects.filter(user=user, movie=movie).last()
-            view = ViewModel.objects.filter(user=user, movie=movie).last()
-            if not view:
-                ViewModel.objects.create(user=user, movie=movie, user_ip=ip)
-                WatchHistory.objects.create(user=user, movie=movie)
-            else:
-                if view.created_at <= timezone.now() - timedelta(days=1):
-                    ViewModel.objects.create(user=user, movie=movie, user_ip=ip)
-                    watch.objects.create(user=user, movie=movie)
+            ingest_watch_event(user, id, request.META.get("REMOTE_ADDR"))
             return JsonResponse({"status": True, "id": id})
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid data"}, status=400)
@@ -225,4 +204,99 @@ class ToggleMyListView(LoginRequiredMixin, View):
             else:
                 return JsonResponse({"status": True, "id": id})
         except json.JSONDecodeError:
-            return JsonResponse({"error": "Invalid data"}, status=400)
\ No newline at end of file
+            return JsonResponse({"error": "Invalid data"}, status=400)
+
+class AsyncLikeMovie(View):
+    async def post(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({"error": "User not authenticated"}, status=401)
+        try:
+            data = json.loads(request.body)
+            id = data["id"]
+            if not isinstance(id, int):
+                return JsonResponse({"error": "Invalid id"}, status=400)
+            try:
+                movie = await Movie.objects.aget(pk=id)
+            except Movie.DoesNotExist:
+                return JsonResponse({"error": "Movie not found"}, status=404)
+            if await WatchHistory.objects.filter(user=user, movie=movie).aexists():
+                like, created = await Like.objects.aget_or_create(user=user, movie=movie)
+                if not created:
+                    await like.adelete()
+                    await sync_to_async(record_like)(user, movie.id, like.created_at, liked=False)
+                    return JsonResponse({"status": False, "id": id})
+                else:
+                    await sync_to_async(record_like)(user, movie.id, like.created_at)
+                    return JsonResponse({"status": True, "id": id})
+            else:
+                return JsonResponse({"error": "Movie has not been watched."}, status=400)
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid data"}, status=400)
+
+
+class AsyncUpdateHistory(View):
+    async def post(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({"error": "User not authenticated"}, status=401)
+        try:
+            data = json.loads(request.body)
+            id = data["id"]
+            if not isinstance(id, int):
+                return JsonResponse({"error": "Invalid id"}, status=400)
+            if not await Movie.objects.filter(pk=id).aexists():
+                return JsonResponse({"error": "Movie not found"}, status=404)
+            await sync_to_async(ingest_watch_event)(user, id, request.META.get("REMOTE_ADDR"))
+            return JsonResponse({"status": True, "id": id})
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid data"}, status=400)
+
+
+class AsyncToggleMyListView(View):
+    async def post(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        try:
+            data = json.loads(request.body)
+            id = data["id"]
+            if not isinstance(id, int):
+                return JsonResponse({"error": "Invalid movie ID"}, status=400)
+            try:
+                movie = await Movie.objects.aget(pk=id)
+            except Movie.DoesNotExist:
+                return JsonResponse({"error": "Movie not found"}, status=404)
+            my_list, created = await MyList.objects.aget_or_create(user=user, movie=movie)
+            if not created:
+                await my_list.adelete()
+                return JsonResponse({"status": False, "id": id})
+            else:
+                return JsonResponse({"status": True, "id": id})
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid data"}, status=400)
+
+class RecommendationIndexStatusView(UserPassesTestMixin, View):
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        return JsonResponse(index_status())
+
+@method_decorator(revalidate(autocomplete_etag), name="get")
+class AutocompleteView(View):
+    def get(self, request):
+        query = request.GET.get("q", "")
+        try:
+            limit = int(request.GET.get("limit", 8))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return JsonResponse({"error": "Invalid limit"}, status=400)
+        index = get_autocomplete_index()
+        started = time.perf_counter()
+        results = index.lookup(query, limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        response = JsonResponse({"query": query, "results": results})
+        response["Server-Timing"] = f"autocomplete;dur={elapsed:.3f}"
+        return response